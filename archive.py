@@ -0,0 +1,73 @@
+"""
+Moves ABORTED, TIMEOUT and CANCEL games with their GamePlayers and GameArgs rows out of the hot
+tables into the Archived tables, a batch per transaction. The AllGames, AllGamePlayers and
+AllGameArgs views still see every game.
+
+    python archive.py [--days 30] [--no-compact]
+"""
+import argparse
+import datetime
+
+from sqlite3 import Cursor
+
+import discord_db as db
+
+from queries import (
+    Operation, archive_game, archive_game_args, archive_game_players, delete_game, delete_game_args,
+    delete_game_players, get_archivable_games)
+
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_BATCH_SIZE = 500  # games per transaction, writers wait for one batch at most
+
+
+@Operation
+def archive_batch(cursor: Cursor, created_before: str, limit: int) -> int:
+    """
+    Archives up to limit games created before created_before, returns how many were moved.
+    """
+    ids = [(game['id'], ) for game in get_archivable_games.execute_in(cursor, created_before, limit).fetchall()]
+    archive_game.execute_many_in(cursor, ids)
+    archive_game_players.execute_many_in(cursor, ids)
+    archive_game_args.execute_many_in(cursor, ids)
+    delete_game_players.execute_many_in(cursor, ids)
+    delete_game_args.execute_many_in(cursor, ids)
+    delete_game.execute_many_in(cursor, ids)
+    return len(ids)
+
+
+def archive_games(days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                  compact: bool = True) -> int:
+    """
+    Archives every terminal non scoring game older than days, then compacts the database.
+    The newest game is never archived so its id is not reused. Returns the number of games moved.
+    """
+    created_before = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    archived = 0
+    while True:
+        moved = archive_batch(created_before, batch_size)
+        archived += moved
+        if moved < batch_size:
+            break
+    if compact and archived > 0:
+        compact_database()
+    return archived
+
+
+def compact_database() -> None:
+    # VACUUM can not run inside a transaction, it takes the write lock for the rewrite
+    db.with_retry('compact_database', _vacuum)
+
+
+def _vacuum() -> None:
+    with db.connection() as cursor:
+        cursor.execute('VACUUM')
+        cursor.execute('PRAGMA optimize')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archive aborted, timed out and canceled games')
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS, help='archive games older than this')
+    parser.add_argument('--no-compact', action='store_true', help='skip the VACUUM after archiving')
+    args = parser.parse_args()
+    db.ensure_database_exists()
+    print(f'Archived {archive_games(args.days, compact=not args.no_compact)} games')
@@ -0,0 +1,70 @@
+"""
+Per-query latency of the old connect-per-call pattern against the pooled connections.
+Run from the repository root: python -m benchmarks.db_connections [iterations]
+"""
+import os
+import sys
+import sqlite3
+import tempfile
+import time
+
+import discord_db
+import queries
+
+from utility import dict_factory
+
+PLAYERS = 200
+
+
+def _seed(path: str) -> None:
+    discord_db.use_database(path)
+    with discord_db.transaction() as cursor:
+        discord_db.create_tables(cursor)
+        cursor.executemany('INSERT INTO Players(discord_id, steam_id, mmr) VALUES(?,?,?)',
+                           [(i, i, 1000) for i in range(1, PLAYERS + 1)])
+
+
+def _connect_per_call_read(path: str, discord_id: int) -> None:
+    # the pattern every execute_* wrapper used before the pool
+    conn = sqlite3.connect(path, uri=True)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.row_factory = dict_factory
+    cursor = conn.cursor()
+    cursor.execute(queries.get_player.sql, (discord_id, ))
+    cursor.fetchone()
+    conn.close()
+
+
+def _connect_per_call_write(path: str, id: int) -> None:
+    conn = sqlite3.connect(path, uri=True)
+    conn.execute('PRAGMA journal_mode=WAL')
+    cursor = conn.cursor()
+    cursor.execute('UPDATE Players SET mmr = mmr + ? WHERE id = ?', (1, id))
+    conn.commit()
+    conn.close()
+
+
+def _time(label: str, iterations: int, function, *args) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        function(*args, i % PLAYERS + 1)
+    per_query = (time.perf_counter() - start) / iterations * 1e6
+    print(f'{label:<32} {per_query:10.1f} us/query')
+    return per_query
+
+
+def main(iterations: int = 2000) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        _seed(path)
+        before_read = _time('read  connect-per-call', iterations, _connect_per_call_read, path)
+        after_read = _time('read  pooled', iterations, queries.get_player)
+        before_write = _time('write connect-per-call', iterations, _connect_per_call_write, path)
+        after_write = _time('write pooled', iterations, queries.update_player_mmr_won, 1)
+        print(f'read speedup  {before_read / after_read:.1f}x')
+        print(f'write speedup {before_write / after_write:.1f}x')
+        discord_db.close_connections()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,37 @@
+"""
+Synthetic mmr distributions for seeding the matchmaking benchmarks, each a function of a random
+generator and a player count returning integer mmrs.
+"""
+import random
+
+from typing import Callable, Dict, List
+
+STARTING_MMR = 1000  # league_starting_mmr
+
+
+def normal(rng: random.Random, n: int) -> List[int]:
+    # a settled league
+    return [round(rng.gauss(STARTING_MMR, 150)) for _ in range(n)]
+
+
+def uniform(rng: random.Random, n: int) -> List[int]:
+    return [rng.randint(700, 1600) for _ in range(n)]
+
+
+def new_season(rng: random.Random, n: int) -> List[int]:
+    # most players still at the starting mmr, a few games in for the rest
+    return [STARTING_MMR if rng.random() < 0.6 else STARTING_MMR + 25 * rng.randint(-4, 4) for _ in range(n)]
+
+
+def bimodal(rng: random.Random, n: int) -> List[int]:
+    # newcomers and veterans queueing together
+    return [round(rng.gauss(900, 60)) if rng.random() < 0.5 else round(rng.gauss(1350, 80)) for _ in range(n)]
+
+
+def skewed(rng: random.Random, n: int) -> List[int]:
+    # a long tail of a few very high mmr players
+    return [round(800 + rng.lognormvariate(5, 0.6)) for _ in range(n)]
+
+
+DISTRIBUTIONS: Dict[str, Callable[[random.Random, int], List[int]]] = {
+    'normal': normal, 'uniform': uniform, 'new_season': new_season, 'bimodal': bimodal, 'skewed': skewed}
@@ -0,0 +1,44 @@
+"""
+Batch matchmaking of a queue burst, partitioning and balancing every lobby, against taking
+LOBBY_SIZE players at a time in queue order. Reports the time per batch and the worst and mean
+mmr spread inside a lobby for both.
+Run from the repository root: python -m benchmarks.matchmaking [repeats]
+"""
+import random
+import statistics
+import sys
+import time
+
+from balancer import balanced_splits
+from matchmaker import partition_lobbies, spread, worst_spread
+
+LOBBY_SIZE = 10
+QUEUE_SIZES = (100, 250, 500, 1000)
+
+
+def fifo_lobbies(queued: int) -> list:
+    return [list(range(start, start + LOBBY_SIZE)) for start in range(0, queued - queued % LOBBY_SIZE, LOBBY_SIZE)]
+
+
+def main(repeats: int = 20) -> None:
+    rng = random.Random(0)
+    for size in QUEUE_SIZES:
+        queues = [[int(rng.gauss(1000, 150)) for _ in range(size)] for _ in range(repeats)]
+        start = time.perf_counter()
+        batches = []
+        for mmrs in queues:
+            lobbies = partition_lobbies(mmrs, LOBBY_SIZE)
+            for lobby in lobbies:
+                balanced_splits([mmrs[index] for index in lobby], 25)
+            batches.append(lobbies)
+        elapsed = (time.perf_counter() - start) / repeats
+        batch_worst = statistics.mean(worst_spread(mmrs, lobbies) for mmrs, lobbies in zip(queues, batches))
+        fifo_worst = statistics.mean(worst_spread(mmrs, fifo_lobbies(size)) for mmrs in queues)
+        batch_mean = statistics.mean(spread(mmrs, lobby) for mmrs, lobbies in zip(queues, batches) for lobby in lobbies)
+        fifo_mean = statistics.mean(spread(mmrs, lobby) for mmrs in queues for lobby in fifo_lobbies(size))
+        print(f'{size:>5} queued  {elapsed * 1000:7.2f} ms/batch  worst spread {batch_worst:6.0f} (fifo {fifo_worst:4.0f})'
+              f'  mean spread {batch_mean:6.0f} (fifo {fifo_mean:4.0f})')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
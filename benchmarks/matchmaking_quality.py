@@ -0,0 +1,185 @@
+"""
+Speed and fairness of each team balancing strategy per lobby size and mmr distribution.
+
+    python -m benchmarks.matchmaking_quality [--sizes 10 12 16] [--distributions ...] [--strategies ...]
+                                             [--lobbies 200] [--seed 0] [--json] [--output FILE]
+
+Strategies:
+    shuffle       balanced_shuffle as the bot runs it
+    roles         balanced_shuffle with random preferred positions
+    combinations  the combinations search balanced_shuffle replaced, stopping at 3 splits under 25
+    draft         select_captains, then both captains always pick the highest mmr left, 1 2 2 1 order
+
+Per strategy, size and distribution: time per lobby (mean and p95), the gap between the team
+average mmrs (mean and p95), how far the Elo expected score is from an even game
+(mean and p95), and over repeated runs on the same lobbies the distinct splits chosen and their
+entropy in bits. --json prints the run as one JSON line, --output appends it to a file for trends.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.distributions import DISTRIBUTIONS
+from matchmaker import select_captains
+from models.records import Player
+from rating import expected_score
+from utility import BALANCE_TOLERANCE, balanced_shuffle
+
+LOBBY_SIZES = (10, 12, 16)
+MAX_SIZES = {'combinations': 12, 'roles': 12}  # slower strategies, C(16, 8) combinations is 60 ms a lobby
+CAPTAIN_SHARE = 0.2  # players marked captain in the draft strategy
+DIVERSITY_LOBBIES = 20
+DIVERSITY_DRAWS = 50
+SUFFICIENT_NUMBER_OF_RESULTS_FOUND = 3  # where the combinations search stopped
+
+
+def shuffle(players: List[Player], rng: random.Random) -> None:
+    balanced_shuffle(players)
+
+
+def roles(players: List[Player], rng: random.Random) -> None:
+    balanced_shuffle(players, True)
+
+
+def combinations(players: List[Player], rng: random.Random) -> None:
+    # the search before the split table, collecting splits under tolerance in generation order
+    min_diff = float('inf')
+    result: Any = None
+    result_list = []
+    for comb in itertools.combinations(players, len(players) // 2):
+        first = set(map(id, comb))
+        diff = abs(sum(player.mmr for player in comb) - sum(player.mmr for player in players if id(player) not in first))
+        if diff < min_diff:
+            min_diff = diff
+            result = first
+        if diff < BALANCE_TOLERANCE:
+            result_list.append(first)
+            if len(result_list) == SUFFICIENT_NUMBER_OF_RESULTS_FOUND:
+                break
+    if len(result_list) == SUFFICIENT_NUMBER_OF_RESULTS_FOUND:
+        result = rng.choice(result_list)
+    team = rng.randint(0, 1)
+    for player in players:
+        player.team = team if id(player) in result else 1 - team
+
+
+def draft(players: List[Player], rng: random.Random) -> None:
+    captains, left, drafter = select_captains(players)
+    teams = [[captains[0]], [captains[1]]]
+    turn = captains.index(drafter)
+    left = sorted(left, key=lambda player: -player.mmr)
+    for pick, player in enumerate(left):
+        teams[turn if pick % 4 in (0, 3) else 1 - turn].append(player)
+    for team, members in enumerate(teams):
+        for player in members:
+            player.team = team
+
+
+STRATEGIES: Dict[str, Callable[[List[Player], random.Random], None]] = {
+    'shuffle': shuffle, 'roles': roles, 'combinations': combinations, 'draft': draft}
+
+
+def make_lobby(rng: random.Random, mmrs: List[int]) -> List[Player]:
+    return [Player(id=index, mmr=mmr, captain=int(rng.random() < CAPTAIN_SHARE),
+                   roles=rng.sample(range(1, 6), rng.randint(0, 3))) for index, mmr in enumerate(mmrs)]
+
+
+def team_averages(players: List[Player]) -> List[float]:
+    return [float(np.mean([player.mmr for player in players if player.team == team])) for team in (0, 1)]
+
+
+def split_key(players: List[Player]) -> frozenset:
+    # the team of the first player, a split and its mirror are the same
+    return frozenset(player.id for player in players if player.team == players[0].team)
+
+
+def entropy(counts: Counter) -> float:
+    total = sum(counts.values())
+    return -sum(count / total * math.log2(count / total) for count in counts.values())
+
+
+def measure(strategy: str, size: int, distribution: str, lobbies: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(f'{seed}-{size}-{distribution}')  # the same lobbies for every strategy
+    random.seed(seed)  # balanced_shuffle draws from the module generator
+    run = STRATEGIES[strategy]
+    pools = [make_lobby(rng, DISTRIBUTIONS[distribution](rng, size)) for _ in range(lobbies)]
+    times, gaps, skews = [], [], []
+    for players in pools:
+        start = time.perf_counter()
+        run(players, rng)
+        times.append(time.perf_counter() - start)
+        radiant, dire = team_averages(players)
+        gaps.append(abs(radiant - dire))
+        skews.append(abs(expected_score(radiant, dire) - 0.5))
+    distinct, entropies = [], []
+    for players in pools[:DIVERSITY_LOBBIES]:
+        chosen: Counter = Counter()
+        for _ in range(DIVERSITY_DRAWS):
+            run(players, rng)
+            chosen[split_key(players)] += 1
+        distinct.append(len(chosen))
+        entropies.append(entropy(chosen))
+    return {
+        'strategy': strategy, 'lobby_size': size, 'distribution': distribution, 'lobbies': lobbies,
+        'time_ms_mean': float(np.mean(times)) * 1000, 'time_ms_p95': float(np.percentile(times, 95)) * 1000,
+        'gap_mean': float(np.mean(gaps)), 'gap_p95': float(np.percentile(gaps, 95)),
+        'win_prob_skew_mean': float(np.mean(skews)), 'win_prob_skew_p95': float(np.percentile(skews, 95)),
+        'distinct_splits_mean': float(np.mean(distinct)), 'split_entropy_bits': float(np.mean(entropies))}
+
+
+def commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes: List[int], distributions: List[str], strategies: List[str],
+              lobbies: int, seed: int) -> Dict[str, Any]:
+    results = [measure(strategy, size, distribution, lobbies, seed)
+               for strategy in strategies for size in sizes for distribution in distributions
+               if size <= MAX_SIZES.get(strategy, size)]
+    return {'benchmark': 'matchmaking_quality', 'created_at': datetime.datetime.utcnow().isoformat(timespec='seconds'),
+            'commit': commit(), 'python': platform.python_version(), 'seed': seed, 'results': results}
+
+
+def print_table(run: Dict[str, Any]) -> None:
+    print(f'{"strategy":<13}{"size":>5} {"distribution":<11}{"ms":>8}{"ms p95":>8}{"gap":>8}{"gap p95":>8}'
+          f'{"skew":>8}{"skew p95":>9}{"splits":>8}{"bits":>6}')
+    for r in run['results']:
+        print(f'{r["strategy"]:<13}{r["lobby_size"]:>5} {r["distribution"]:<11}{r["time_ms_mean"]:8.3f}'
+              f'{r["time_ms_p95"]:8.3f}{r["gap_mean"]:8.1f}{r["gap_p95"]:8.1f}{r["win_prob_skew_mean"]:8.3f}'
+              f'{r["win_prob_skew_p95"]:9.3f}{r["distinct_splits_mean"]:8.1f}{r["split_entropy_bits"]:6.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Matchmaking speed and fairness per balancing strategy')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(LOBBY_SIZES))
+    parser.add_argument('--distributions', nargs='+', choices=DISTRIBUTIONS, default=list(DISTRIBUTIONS))
+    parser.add_argument('--strategies', nargs='+', choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument('--lobbies', type=int, default=200, help='lobbies per strategy, size and distribution')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the run as one JSON line instead of a table')
+    parser.add_argument('--output', help='append the run as one JSON line to this file')
+    args = parser.parse_args()
+
+    result = run_suite(args.sizes, args.distributions, args.strategies, args.lobbies, args.seed)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print_table(result)
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(json.dumps(result) + '\n')
@@ -0,0 +1,60 @@
+"""
+Replay time of the in memory mmr engine on synthetic seasons, checked against a game by game replay.
+Run from the repository root: python -m benchmarks.mmr_replay [players]
+"""
+import sys
+import time
+
+import numpy as np
+
+from models.records import Player
+from rating import STARTING_MMR
+from replay import History, replay
+from scoring import rate_game
+
+LOBBY_SIZE = 10
+
+
+def synthetic_history(games: int, players: int, seed: int = 0) -> History:
+    rng = np.random.default_rng(seed)
+    rosters = np.argsort(rng.random((games, players)), axis=1)[:, :LOBBY_SIZE] + 1
+    teams = np.tile(np.arange(LOBBY_SIZE) % 2, games)
+    game_ids = np.arange(1, games + 1)
+    return History(game_ids, rng.integers(0, 2, games), np.repeat(game_ids, LOBBY_SIZE),
+                   rosters.reshape(-1), teams)
+
+
+def sequential_replay(history: History) -> np.ndarray:
+    # one game at a time, what recalculate_mmr used to do with a query per player
+    mmr = {player_id: STARTING_MMR for player_id in history.player_ids.tolist()}
+    entries = list(zip(history.entry_games.tolist(), history.entry_player_ids.tolist(), history.entry_teams.tolist()))
+    start = 0
+    for game, result in enumerate(history.results.tolist()):
+        end = start
+        while end < len(entries) and entries[end][0] == game:
+            end += 1
+        players = [Player(id=player_id, team=team, mmr=mmr[player_id]) for _, player_id, team in entries[start:end]]
+        deltas, _, _ = rate_game(players, result)
+        for player, delta in zip(players, deltas.tolist()):
+            mmr[player.id] += delta
+        start = end
+    return np.array([mmr[player_id] for player_id in history.player_ids.tolist()])
+
+
+def main(players: int = 200) -> None:
+    for games in (10_000, 100_000):
+        history = synthetic_history(games, players)
+        start = time.perf_counter()
+        ratings = replay(history)[0]
+        engine = time.perf_counter() - start
+        start = time.perf_counter()
+        expected = sequential_replay(history)
+        sequential = time.perf_counter() - start
+        if not np.array_equal(ratings, expected):
+            raise AssertionError(f'replay differs from the sequential replay for {games} games')
+        print(f'{games:>7} games {players} players  engine {engine:7.3f}s  sequential {sequential:7.3f}s  '
+              f'{sequential / engine:5.1f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
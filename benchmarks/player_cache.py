@@ -0,0 +1,66 @@
+"""
+The vouched check of a signup: get_player_id on the database executor against the in memory
+PlayerIdCache, for vouched users and for users who are not, who are read once and then
+remembered for the cache ttl. Also the startup load.
+Run from the repository root: python -m benchmarks.player_cache [lookups]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import discord_db
+
+from player_cache import PlayerIdCache
+from queries import get_player_id
+
+PLAYERS = 5_000
+ACTIVE_USERS = 500  # distinct users clicking signup during the run
+
+
+def _seed(path: str) -> None:
+    discord_db.use_database(path)
+    discord_db.apply_migrations()
+    with discord_db.transaction() as cursor:
+        cursor.executemany('INSERT INTO Players(discord_id, steam_id, mmr) VALUES(?,?,?)',
+                           [(10 ** 17 + i, i, 1000) for i in range(PLAYERS)])
+
+
+async def _query(discord_id: int) -> bool:
+    try:
+        await get_player_id.run_async(discord_id)
+    except ValueError:
+        return False
+    return True
+
+
+async def _time(label: str, lookups: int, check, offset: int) -> float:
+    start = time.perf_counter()
+    for i in range(lookups):
+        await check(10 ** 17 + offset + i % ACTIVE_USERS)
+    per_lookup = (time.perf_counter() - start) / lookups * 1e6
+    print(f'{label:<32} {per_lookup:10.1f} us/signup')
+    return per_lookup
+
+
+async def _run(lookups: int) -> None:
+    cache = PlayerIdCache()
+    start = time.perf_counter()
+    cache.load()
+    print(f'load {len(cache)} players {(time.perf_counter() - start) * 1000:.2f} ms')
+    for label, offset in (('vouched', 0), ('not vouched', PLAYERS)):
+        query = await _time(f'{label:<12} get_player_id', lookups, _query, offset)
+        cached = await _time(f'{label:<12} PlayerIdCache', lookups, cache.lookup, offset)
+        print(f'{"":<32} {query / cached:10.0f}x')
+
+
+def main(lookups: int = 5_000) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        _seed(os.path.join(tmp, 'bench.db'))
+        asyncio.run(_run(lookups))
+        discord_db.close_connections()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000)
@@ -0,0 +1,83 @@
+"""
+Queue operations at large queue sizes, PlayerQueue against the plain lists it replaced.
+Every user signs up for both queues, a tenth leave, then the normal queue is drained a lobby at a
+time with the drafted players removed from the draft queue, as _start_games does.
+Run from the repository root: python -m benchmarks.player_queue
+"""
+import random
+import time
+
+from typing import List
+
+from models.player import Player
+from models.queue import PlayerQueue, exclusive
+
+QUEUE_SIZES = (1_000, 5_000, 20_000)
+LOBBY_SIZE = 10
+
+
+def with_lists(users: List[Player], leaving: List[int]) -> int:
+    queue: List[Player] = []
+    draft_queue: List[Player] = []
+    for user in users:
+        if user.id not in [member.id for member in queue]:
+            queue.append(user)
+        if user.id not in [member.id for member in draft_queue]:
+            draft_queue.append(user)
+    for discord_id in leaving:
+        member = next((member for member in queue if member.id == discord_id), None)
+        if member:
+            queue.remove(member)
+        member = next((member for member in draft_queue if member.id == discord_id), None)
+        if member:
+            draft_queue.remove(member)
+    games = 0
+    while len(queue) >= LOBBY_SIZE:
+        for player in queue[:LOBBY_SIZE]:
+            if player in draft_queue:
+                draft_queue.remove(player)
+        queue = queue[LOBBY_SIZE:]
+        games += 1
+    return games
+
+
+def with_queue(users: List[Player], leaving: List[int]) -> int:
+    queue = PlayerQueue()
+    draft_queue = PlayerQueue()
+    exclusive(queue, draft_queue)
+    for user in users:
+        queue.join(user)
+        draft_queue.join(user)
+    for discord_id in leaving:
+        queue.leave(discord_id)
+        draft_queue.leave(discord_id)
+    games = 0
+    while len(queue) >= LOBBY_SIZE:
+        queue.pop(LOBBY_SIZE)
+        games += 1
+    if len(draft_queue) != len(queue):
+        raise AssertionError('players taken into games are still in the draft queue')
+    return games
+
+
+def main() -> None:
+    rng = random.Random(0)
+    for size in QUEUE_SIZES:
+        users = [Player(discord_id) for discord_id in rng.sample(range(10 ** 17, 10 ** 18), size)]
+        leaving = [user.id for user in rng.sample(users, size // 10)]
+        start = time.perf_counter()
+        games = with_queue(users, leaving)
+        indexed = time.perf_counter() - start
+        if size > QUEUE_SIZES[1]:
+            print(f'{size:>6} users  PlayerQueue {indexed * 1000:9.2f} ms  lists skipped, {games} games')
+            continue
+        start = time.perf_counter()
+        if with_lists(users, leaving) != games:
+            raise AssertionError('list queues made a different number of games')
+        lists = time.perf_counter() - start
+        print(f'{size:>6} users  PlayerQueue {indexed * 1000:9.2f} ms  lists {lists * 1000:10.2f} ms  '
+              f'{lists / indexed:7.0f}x  {games} games')
+
+
+if __name__ == '__main__':
+    main()
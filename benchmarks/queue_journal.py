@@ -0,0 +1,82 @@
+"""
+Cost of journaling the signup queues: the signup path with and without the journal attached, a
+flush of a burst of signups in one commit against a commit per change, and restoring the queues
+at startup. The restored queues are checked against the ones written.
+Run from the repository root: python -m benchmarks.queue_journal
+"""
+import os
+import random
+import tempfile
+import time
+
+import discord_db
+
+from models.player import Player
+from models.queue import PlayerQueue, exclusive
+from queries import set_queue_entry
+from queue_journal import QueueJournal
+
+QUEUE_SIZES = (10, 100, 1_000)
+LOBBY_SIZE = 10
+
+
+def queues(journal: QueueJournal = None):
+    queue, draft_queue = PlayerQueue('normal'), PlayerQueue('draft')
+    exclusive(queue, draft_queue)
+    if journal is not None:
+        journal.attach(queue, draft_queue)
+    return queue, draft_queue
+
+
+def signups(queue: PlayerQueue, draft_queue: PlayerQueue, users, leaving) -> float:
+    start = time.perf_counter()
+    for user in users:
+        queue.join(user)
+        draft_queue.join(user)
+    for discord_id in leaving:
+        queue.leave(discord_id)
+    queue.return_to_front(queue.pop(LOBBY_SIZE))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        discord_db.use_database(os.path.join(tmp, 'bench.db'))
+        discord_db.apply_migrations()
+        for size in QUEUE_SIZES:
+            users = [Player(discord_id) for discord_id in rng.sample(range(10 ** 17, 10 ** 18), size)]
+            leaving = [user.id for user in rng.sample(users, size // 10)]
+            plain = signups(*queues(), users, leaving)
+
+            journal = QueueJournal()
+            written = queues(journal)
+            written[0].clear()
+            written[1].clear()
+            journaled = signups(*written, users, leaving)
+            changes = len(journal)
+            start = time.perf_counter()
+            journal.flush()
+            flushed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for index, user in enumerate(users[:LOBBY_SIZE]):
+                set_queue_entry('commits', user.id, index)
+            per_commit = (time.perf_counter() - start) / LOBBY_SIZE
+
+            restoring = QueueJournal()
+            restored = queues(restoring)
+            start = time.perf_counter()
+            count = restoring.restore()
+            restore = time.perf_counter() - start
+            for before, after in zip(written, restored):
+                if [member.id for member in before] != [member.id for member in after]:
+                    raise AssertionError(f'{before.name} queue restored out of order')
+            print(f'{size:>5} players  signups {plain / size * 1e6:6.2f} us/player plain '
+                  f'{journaled / size * 1e6:6.2f} journaled  flush {changes:>5} changes {flushed * 1000:7.2f} ms '
+                  f'(a commit per change {per_commit * changes * 1000:7.2f} ms)  restore {count:>5} players {restore * 1000:6.2f} ms')
+        discord_db.close_connections()
+
+
+if __name__ == '__main__':
+    main()
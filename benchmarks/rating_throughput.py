@@ -0,0 +1,74 @@
+"""
+Games per second of each rating model: one game per call as scoring rates them, a batch of
+independent games in one call, and a replay of a whole season in order. The batched replay is
+checked against rating the same season a game at a time, Elo's list replay also against the
+numpy replay in waves.
+Run from the repository root: python -m benchmarks.rating_throughput [games]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.mmr_replay import LOBBY_SIZE, synthetic_history
+from rating import (
+    DEFAULT_DEVIATION, DEFAULT_VOLATILITY, STARTING_MMR, EloModel, Glicko2Model, RatingModel, replay_in_waves)
+
+PLAYERS = 200
+SINGLE_GAMES = 2000
+
+
+def replay_game_by_game(model: RatingModel, games: np.ndarray, players: np.ndarray, teams: np.ndarray,
+                        results: np.ndarray, player_count: int) -> np.ndarray:
+    mmr = np.full(player_count, STARTING_MMR, dtype=np.int64)
+    deviations = np.full(player_count, DEFAULT_DEVIATION)
+    volatilities = np.full(player_count, DEFAULT_VOLATILITY)
+    for game, result in enumerate(results.tolist()):
+        roster = players[game * LOBBY_SIZE:(game + 1) * LOBBY_SIZE]
+        deltas, deviations[roster], volatilities[roster] = model.rate(
+            np.zeros(LOBBY_SIZE, dtype=np.int64), teams[game * LOBBY_SIZE:(game + 1) * LOBBY_SIZE],
+            np.array([result]), mmr[roster], deviations[roster], volatilities[roster])
+        mmr[roster] += deltas
+    return mmr
+
+
+def main(games: int = 20_000) -> None:
+    history = synthetic_history(games, PLAYERS)
+    entries = (history.entry_games, history.entry_players, history.entry_teams, history.results)
+    rng = np.random.default_rng(1)
+    mmr = rng.integers(700, 1600, games * LOBBY_SIZE)
+    deviations = rng.uniform(50, 350, games * LOBBY_SIZE)
+    volatilities = np.full(games * LOBBY_SIZE, DEFAULT_VOLATILITY)
+    for model in (EloModel(), Glicko2Model()):
+        one = slice(0, LOBBY_SIZE)
+        start = time.perf_counter()
+        for _ in range(SINGLE_GAMES):
+            model.rate(np.zeros(LOBBY_SIZE, dtype=np.int64), history.entry_teams[one], history.results[:1],
+                       mmr[one], deviations[one], volatilities[one])
+        single = SINGLE_GAMES / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        model.rate(history.entry_games, history.entry_teams, history.results, mmr, deviations, volatilities)
+        batch = games / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        replayed = model.replay(*entries, len(history.player_ids))[0]
+        replay = games / (time.perf_counter() - start)
+
+        expected = replay_game_by_game(model, *entries, len(history.player_ids))
+        if not np.array_equal(replayed, expected):
+            raise AssertionError(f'{model.name} replay differs from rating a game at a time')
+        waves = ''
+        if isinstance(model, EloModel):
+            # the numpy replay the plain list replay of EloModel is kept over
+            start = time.perf_counter()
+            replayed = replay_in_waves(model, *entries, len(history.player_ids))[0]
+            waves = f'  numpy waves {games / (time.perf_counter() - start):10,.0f} games/s'
+            if not np.array_equal(replayed, expected):
+                raise AssertionError('elo replay in waves differs from rating a game at a time')
+        print(f'{model.name:<8} single game {single:10,.0f} games/s  batch {batch:12,.0f} games/s  '
+              f'replay {replay:10,.0f} games/s{waves}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,86 @@
+"""
+Team balancing time per lobby size, the split table and meet in the middle against the
+combinations search they replaced. The old search is timed without its early exit, as when no
+split is within tolerance. The split table only covers lobbies up to SPLIT_TABLE_MAX_SIZE, above it
+a balanced split is drawn by sample_balanced, also timed with every player at the same mmr.
+Role balancing is timed over random preferences of up to three positions per player, for the
+lobby sizes balanced_shuffle uses it for, and with every player at the same mmr, its worst case.
+Run from the repository root: python -m benchmarks.team_balance [lobbies]
+"""
+import itertools
+import random
+import sys
+import time
+
+from typing import List
+
+from balancer import (
+    ROLE_BALANCE_MAX_SIZE, SPLIT_TABLE_MAX_SIZE, balanced_splits, best_splits, role_mask, role_splits,
+    sample_balanced)
+
+LOBBY_SIZES = (10, 12, 14, 16, 20, 24)
+BRUTE_FORCE_MAX_SIZE = 20  # C(24, 12) is 2.7 million splits, minutes per lobby
+
+
+def combinations_search(mmrs: List[int]) -> int:
+    # the old balanced_shuffle loop, returns the smallest difference
+    min_diff = float('inf')
+    player_ids = list(enumerate(mmrs))
+    for comb in itertools.combinations(player_ids, len(mmrs) // 2):
+        set1 = set(comb)
+        set2 = set(player_ids) - set1
+        diff = abs(sum(player[1] for player in set1) - sum(player[1] for player in set2))
+        min_diff = min(min_diff, diff)
+    return int(min_diff)
+
+
+def main(lobbies: int = 5) -> None:
+    rng = random.Random(0)
+    for size in LOBBY_SIZES:
+        pools = [[rng.randint(700, 1600) for _ in range(size)] for _ in range(lobbies)]
+        start = time.perf_counter()
+        results = [best_splits(mmrs, 3) for mmrs in pools]
+        engine = (time.perf_counter() - start) / lobbies
+        table = ''
+        if size <= SPLIT_TABLE_MAX_SIZE:
+            start = time.perf_counter()
+            table_results = [balanced_splits(mmrs, 25) for mmrs in pools]
+            table = f'  split table {(time.perf_counter() - start) / lobbies * 1000:7.2f} ms/lobby'
+            if [best for _, best in table_results] != [splits[0] for splits in results]:
+                raise AssertionError(f'split table and meet in the middle disagree at {size} players')
+        else:
+            # drawing a balanced split, the even season has every split of equal mmr players balanced
+            start = time.perf_counter()
+            for mmrs in pools:
+                sample_balanced(mmrs, 25)
+            sampled = (time.perf_counter() - start) / lobbies
+            start = time.perf_counter()
+            for _ in pools:
+                sample_balanced([1000] * size, 25)
+            even = (time.perf_counter() - start) / lobbies
+            table = f'  sample {sampled * 1000:7.2f} ms/lobby  even season {even * 1000:7.2f} ms/lobby'
+        if size <= ROLE_BALANCE_MAX_SIZE:
+            roles = [[role_mask(rng.sample(range(1, 6), rng.randint(0, 3))) for _ in mmrs] for mmrs in pools]
+            start = time.perf_counter()
+            for mmrs, role_masks in zip(pools, roles):
+                role_splits(mmrs, role_masks, 25, 100)
+            spread = (time.perf_counter() - start) / lobbies
+            start = time.perf_counter()
+            for role_masks in roles:
+                role_splits([1000] * size, role_masks, 25, 100)
+            even = (time.perf_counter() - start) / lobbies
+            table += f'  roles {spread * 1000:7.2f} ms/lobby  even season {even * 1000:7.2f} ms/lobby'
+        if size > BRUTE_FORCE_MAX_SIZE:
+            print(f'{size:>3} players{table}  meet in the middle {engine * 1000:9.2f} ms/lobby  combinations skipped')
+            continue
+        start = time.perf_counter()
+        expected = [combinations_search(mmrs) for mmrs in pools]
+        brute_force = (time.perf_counter() - start) / lobbies
+        if [splits[0][0] for splits in results] != expected:
+            raise AssertionError(f'best split differs from the combinations search at {size} players')
+        print(f'{size:>3} players{table}  meet in the middle {engine * 1000:9.2f} ms/lobby  '
+              f'combinations {brute_force * 1000:9.2f} ms/lobby  {brute_force / engine:7.1f}x')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
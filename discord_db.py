@@ -1,249 +1,57 @@
 import sqlite3
 import json
 import os
+import argparse
 import asyncio
-
-from typing import Any, List, Union
+import datetime
+import glob
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple, TypeVar
 from sqlite3 import Connection, Cursor
 from models.errors import DataBaseErrorNonModified
-from utility import calculate_elo, dict_factory
+from utility import dict_factory
 
 DB_PATH = 'db/league.db'
 DB_PATH_FILE = 'file:db/league.db'
 STEAM_ACCOUNTS_PATH = 'steam_bot_acc.json'
-
-# Player
-
-
-def get_all_players(cursor: Cursor) -> None:
-    cursor.execute('SELECT * FROM Players')
-
-
-def add_player(cursor: Cursor, discord_id: str, steam_id: str, mmr: str) -> None:
-    cursor.execute('''INSERT INTO Players(discord_id, steam_id, mmr)
-                        VALUES(?,?,?)''', (discord_id, steam_id, mmr))
-
-
-def get_player_id(cursor: Cursor, discord_id: str) -> None:
-    cursor.execute(
-        'SELECT id FROM Players WHERE discord_id = ?', (discord_id, ))
-
-
-def get_player(cursor: Cursor, discord_id: str) -> None:
-    cursor.execute(
-        'SELECT * FROM Players WHERE discord_id = ?', (discord_id, ))
-
-
-def update_player_mmr_won(cursor: Cursor, id: str, elo_change: str) -> None:
-    cursor.execute(
-        f'''UPDATE Players SET mmr = mmr + ? WHERE id = ?''', (elo_change, id))
-
-
-def update_player_mmr_lost(cursor: Cursor, id: str, elo_change: str) -> None:
-    cursor.execute(
-        f'''UPDATE Players SET mmr = mmr - ? WHERE id = ?''', (elo_change, id))
-
-
-def get_player_rank(cursor: Cursor, id: str) -> None:
-    cursor.execute(
-        f'''SELECT discord_id, mmr, (SELECT COUNT(*) FROM Players p WHERE p.mmr > p2.mmr and EXISTS(select * from Game g join GamePlayers gp on g.id = gp.game_id WHERE g.status = 'OVER' and gp.player_id = p.id )) + 1 AS rank FROM Players p2 WHERE id = ?''', (id,))
-
-
-def reset_all_player_mmr(cursor: Cursor) -> None:
-    cursor.execute(
-        f'''UPDATE Players SET mmr = 1000''')
-
-
-def get_if_player_played_game(cursor: Cursor, id: str) -> None:
-    cursor.execute(
-        f'''SELECT count(*) as played FROM GamePlayers gp join Game g on gp.game_id = g.id where gp.player_id = ? and g.status = 'OVER' LIMIT 1''', (id,))
-
-
-def get_players_wins_and_losses(cursor: Cursor, id: str) -> None:
-    cursor.execute(
-        f'''SELECT (SELECT COUNT(*) FROM GamePlayers gp join Game g on gp.game_id = g.id where gp.player_id = ? and g.status = 'OVER' and gp.team = g.result) as wins, (SELECT COUNT(*) FROM GamePlayers gp join Game g on gp.game_id = g.id where gp.player_id = ? and g.status = 'OVER' and gp.team <> g.result) as losses''', (id, id))
-
-#PlayerRoles
-
-def delete_player_roles(cursor: Cursor, player_id: str) -> None:
-    cursor.execute(
-        f'''DELETE FROM PlayerRoles WHERE player_id = ?''', (player_id, ))
-
-def set_player_role(cursor: Cursor, player_id: str, role: str) -> None:
-    cursor.execute(
-        f'''INSERT INTO PlayerRoles(player_id, role) VALUES(?,?)''', (player_id, role))
-    
-def get_player_role(cursor: Cursor, player_id: str) -> None:
-    cursor.execute(
-        f'''SELECT role FROM PlayerRoles WHERE player_id = ?''', (player_id, ))
-
-def set_player_captain(cursor: Cursor, id: str) -> None:
-    cursor.execute(
-        f'''UPDATE Players SET captain = 1 WHERE id = ?''', (id, ))
-
-# Game
-
-
-def get_game(cursor: Cursor, id: str) -> None:
-    cursor.execute('SELECT * FROM Game WHERE id = ?', (id, ))
-
-
-def add_game(cursor: Cursor, type: str) -> None:
-    cursor.execute(
-        '''INSERT INTO Game(status, result, steam_match_id, type) VALUES(?, ?, ?, ?)''', ('PREGAME', None, None, type))
-
-
-def set_game_status_aborted(cursor: Cursor, id: str) -> None:
-    cursor.execute(
-        '''UPDATE Game SET status = ? WHERE id = ?''', ('ABORTED', id))
-
-
-def set_game_status_pregame(cursor: Cursor, id: str) -> None:
-    cursor.execute(
-        '''UPDATE Game SET status = ? WHERE id = ?''', ('PREGAME', id))
-
-
-def get_game_id_where_status_pregame(cursor: Cursor) -> None:
-    cursor.execute(
-        'SELECT Id FROM Game WHERE status = ? LIMIT 1', ('PREGAME', ))
-
-
-def set_game_status_hosted(cursor: Cursor, game_id: str) -> None:
-    cursor.execute(
-        '''UPDATE Game SET status = 'HOSTED' WHERE id = ?''', (game_id,))
-
-
-def score_game(cursor: Cursor, game_id: str, result: int, steam_match_id) -> None:
-    cursor.execute(
-        f'''UPDATE Game SET result = ?, status = 'OVER', steam_match_id = ? WHERE id = ?''', (result, steam_match_id, game_id))
-
-
-def set_game_status_started(cursor: Cursor, game_id: str) -> None:
-    cursor.execute(
-        '''UPDATE Game SET status = 'STARTED' WHERE id = ?''', (game_id,))
-
-
-def get_game_id_where_status_rehost(cursor: Cursor) -> None:
-    cursor.execute(
-        'SELECT Id FROM Game WHERE status = ? LIMIT 1', ('REHOST', ))
-
-
-def get_game_id_where_status_cancel(cursor: Cursor) -> None:
-    cursor.execute(
-        'SELECT Id FROM Game WHERE status = ? LIMIT 1', ('CANCEL', ))
-
-
-def set_game_status_cancel(cursor: Cursor, game_id: str) -> None:
-    cursor.execute(
-        '''UPDATE Game SET status = 'CANCEL' WHERE id = ?''', (game_id,))
-
-
-def set_game_status_rehost(cursor: Cursor, game_id: str) -> None:
-    cursor.execute(
-        '''UPDATE Game SET status = 'REHOST' WHERE id = ?''', (game_id,))
-
-
-def get_games_where_status_over(cursor: Cursor) -> None:
-    cursor.execute(
-        'SELECT * FROM Game WHERE status = ?', ('OVER', ))
-
-
-def get_scored_games_with_steam_match_id(cursor: Cursor) -> None:
-    cursor.execute(
-        'SELECT steam_match_id FROM Game WHERE status = ? and steam_match_id is not NULL and steam_match_id <> 0', ('OVER', ))
-
-
-def get_active_games(cursor: Cursor) -> None:
-    cursor.execute('SELECT * FROM Game WHERE status = "STARTED"')
-
-def set_game_status_timeout(cursor: Cursor, game_id: str) -> None:
-    cursor.execute(
-        '''UPDATE Game SET status = 'TIMEOUT' WHERE id = ?''', (game_id,))
-    
-def get_game_where_status_timeout(cursor: Cursor) -> None:
-    cursor.execute(
-        '''SELECT * FROM Game WHERE status = 'TIMEOUT' ''')
-
-# GamePlayers
-
-
-def add_player_to_game(cursor: Cursor, game_id: str, player_id: str, team: str) -> None:
-    cursor.execute(
-        '''INSERT INTO GamePlayers(game_id, player_id, team) VALUES(?,?,?)''', (game_id, player_id, team))
-
-
-def get_all_players_from_game(cursor: Cursor, game_id: str) -> None:
-    cursor.execute(
-        'SELECT p.id, discord_id, steam_id, mmr, gp.team as team FROM GamePlayers gp join Players p on gp.player_id = p.id WHERE game_id = ?', (game_id, ))
-    
-def set_player_arrived(cursor: Cursor, game_id: str, player_id: str) -> None:
-    cursor.execute(
-        'UPDATE GamePlayers SET arrived = 1 WHERE game_id = ? and player_id = ?', (game_id, player_id))
-    
-def set_player_left(cursor: Cursor, game_id: str, player_id: str) -> None:
-    cursor.execute(
-        'UPDATE GamePlayers SET arrived = 0 WHERE game_id = ? and player_id = ?', (game_id, player_id))    
-
-def get_players_arrived(cursor: Cursor, game_id: str) -> None:
-    cursor.execute(
-        'SELECT p.discord_id as id FROM GamePlayers gp JOIN Players p on gp.player_id = p.id WHERE game_id = ? and arrived = 1', (game_id, ))
-
-def reset_all_players_arrived(cursor: Cursor, game_id: str) -> None:
-    cursor.execute(
-        'UPDATE GamePlayers SET arrived = 0 WHERE game_id = ?', (game_id, ))
-# GameArgs
-
-
-def add_game_args(cursor: Cursor, game_id: str, lobby_name: str, lobby_password: str) -> None:
-    cursor.execute('''INSERT INTO GameArgs(game_id, lobby_name, lobby_password) VALUES(?,?,?)''',
-                   (game_id, lobby_name, lobby_password))
-
-
-def get_game_args(cursor: Cursor, game_id: str) -> None:
-    cursor.execute(
-        'SELECT lobby_name,lobby_password FROM GameArgs WHERE game_id = ?', (game_id, ))
-
-# SteamBots
-
-
-def add_bot(cursor: Cursor, username: str, password: str) -> None:
-    cursor.execute(
-        '''INSERT INTO SteamBots(username, password, status) VALUES(?,?,0)''', (username, password))
-
-
-def get_free_bot(cursor: Cursor) -> None:
-    cursor.execute('''SELECT * FROM SteamBots WHERE status = 0 LIMIT 1''')
-
-
-def get_steam_bot(cursor: Cursor, id: str) -> None:
-    cursor.execute('''SELECT * FROM SteamBots WHERE id = ?''', (id,))
-
-
-def reserve_bot(cursor: Cursor, id: str) -> None:
-    cursor.execute('''UPDATE SteamBots SET status = 1 WHERE id = ?''', (id,))
-
-
-def get_bot_from_username(cursor: Cursor, username: str) -> None:
-    cursor.execute(
-        f'''SELECT * FROM SteamBots WHERE username = ?''', (username,))
-
-
-def free_bot(cursor: Cursor, username: str) -> None:
-    cursor.execute(
-        f'''UPDATE SteamBots SET status = 0 WHERE username = ?''', (username,))
-
-
-# Agreagtion
-def get_leaderboards(cursor: Cursor) -> None:
-    cursor.execute("""
-    SELECT discord_id, 
-           mmr
-    FROM players
-    WHERE id in (select player_id from gameplayers where game_id in (select id from game where status = 'OVER')) 
-    ORDER BY mmr DESC
-
-    """)
-
+DB_EXECUTOR_WORKERS = 4  # threads serving the awaitable api, each keeps its own pooled connection
+STATEMENT_CACHE_SIZE = 256  # prepared statements kept per connection, must fit every registered query
+
+# lock contention, sqlite waits BUSY_TIMEOUT_MS itself before a statement fails as locked
+BUSY_TIMEOUT_MS = 3000
+LOCK_RETRIES = 5
+BACKOFF_BASE = 0.05  # seconds, doubled every retry
+BACKOFF_CAP = 2.0
+
+# applied once to every pooled connection
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',  # WAL stays consistent, fsync only on checkpoint
+    'PRAGMA cache_size=-16000',  # 16 MiB page cache
+    'PRAGMA mmap_size=268435456',  # 256 MiB memory mapped reads
+    'PRAGMA temp_store=MEMORY',
+    f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}',
+)
+
+# online backups, copied page steps at a time so writers only wait for one step
+BACKUP_DIR_NAME = 'backups'  # next to the database
+BACKUP_RETENTION = 14  # snapshots kept by rotation
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.01  # seconds between steps
+
+# read only connections never write, journal mode and sync are the writer's business
+READER_PRAGMAS = (
+    'PRAGMA query_only=ON',
+    'PRAGMA cache_size=-32000',  # 32 MiB, readers serve the stats, leaderboard and polling loops
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA temp_store=MEMORY',
+    f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}',
+)
 
 def create_tables(cursor: Connection) -> None:
     cursor.execute('''CREATE TABLE IF NOT EXISTS Players
@@ -260,12 +68,13 @@ def create_tables(cursor: Connection) -> None:
     # status PREGAME => REHOST(rehost) => PREGAME
 
     # type DRAFT | NORMAL
+    # created_at is added by migration 6, ABORTED, TIMEOUT and CANCEL games move to ArchivedGame with age
 
     cursor.execute('''CREATE TABLE IF NOT EXISTS Game
                             (id INTEGER PRIMARY KEY,
                             status TEXT  , 
                             result INTEGER,
-                            steam_match_id INTEGER
+                            steam_match_id INTEGER,
                             type TEXT)''')
 
     cursor.execute('''CREATE TABLE IF NOT EXISTS GamePlayers
@@ -296,166 +105,549 @@ def create_tables(cursor: Connection) -> None:
                     role INTEGER,
                     FOREIGN KEY(player_id) REFERENCES Player(id))''')
 
-# wrapper functions
+# schema migrations, applied in order by ensure_database_exists, never edit a released step
+
+
+def _add_game_type_column(cursor: Cursor) -> None:
+    # databases created before the missing comma in the Game DDL was fixed have no type column
+    columns = [column['name'] for column in cursor.execute('PRAGMA table_info(Game)').fetchall()]
+    if 'type' not in columns:
+        cursor.execute('ALTER TABLE Game ADD COLUMN type TEXT')
+
+
+def _add_hot_path_indexes(cursor: Cursor) -> None:
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_players_discord_id ON Players(discord_id)')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_game_status ON Game(status)')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_gameplayers_game_player ON GamePlayers(game_id, player_id)')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_gameplayers_player_game_team ON GamePlayers(player_id, game_id, team)')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_gameargs_game_id ON GameArgs(game_id)')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_playerroles_player_id ON PlayerRoles(player_id)')
+
+
+def _add_rating_changes_table(cursor: Cursor) -> None:
+    cursor.execute('''CREATE TABLE IF NOT EXISTS RatingChanges
+                    (id INTEGER PRIMARY KEY,
+                    game_id INTEGER,
+                    player_id INTEGER,
+                    mmr_before INTEGER,
+                    delta INTEGER,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY(game_id) REFERENCES Game(id),
+                    FOREIGN KEY(player_id) REFERENCES Players(id))''')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_ratingchanges_player_game ON RatingChanges(player_id, game_id)')
+
+
+def _add_player_stats_table(cursor: Cursor) -> None:
+    # streak is the current run, positive for wins and negative for losses
+    # last_played is the id of the last scored game
+    cursor.execute('''CREATE TABLE IF NOT EXISTS PlayerStats
+                    (player_id INTEGER PRIMARY KEY,
+                    games INTEGER DEFAULT 0,
+                    wins INTEGER DEFAULT 0,
+                    losses INTEGER DEFAULT 0,
+                    last_played INTEGER,
+                    streak INTEGER DEFAULT 0,
+                    FOREIGN KEY(player_id) REFERENCES Players(id),
+                    FOREIGN KEY(last_played) REFERENCES Game(id))''')
+    fill_player_stats(cursor)
+
+
+def fill_player_stats(cursor: Cursor) -> None:
+    """
+    Computes PlayerStats of every player from the scored games, the table is expected to be empty.
+    """
+    cursor.execute('''WITH history AS (
+                        SELECT gp.player_id, g.id AS game_id, gp.team = g.result AS won
+                        FROM GamePlayers gp JOIN Game g ON g.id = gp.game_id
+                        WHERE g.status = 'OVER'),
+                    totals AS (
+                        SELECT player_id, COUNT(*) AS games, SUM(won) AS wins, MAX(game_id) AS last_played
+                        FROM history GROUP BY player_id),
+                    last AS (
+                        SELECT t.*, h.won FROM totals t
+                        JOIN history h ON h.player_id = t.player_id AND h.game_id = t.last_played)
+                    INSERT INTO PlayerStats(player_id, games, wins, losses, last_played, streak)
+                    SELECT player_id, games, wins, games - wins, last_played,
+                        (CASE WHEN won THEN 1 ELSE -1 END) * (
+                            SELECT COUNT(*) FROM history h WHERE h.player_id = last.player_id
+                            AND h.game_id > COALESCE((SELECT MAX(game_id) FROM history d
+                                                      WHERE d.player_id = last.player_id AND d.won <> last.won), 0))
+                    FROM last''')
+
+
+def _add_game_archive(cursor: Cursor) -> None:
+    # games created before this migration have no created_at, archival treats them as old
+    columns = [column['name'] for column in cursor.execute('PRAGMA table_info(Game)').fetchall()]
+    if 'created_at' not in columns:
+        cursor.execute('ALTER TABLE Game ADD COLUMN created_at TEXT')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ArchivedGame
+                    (id INTEGER PRIMARY KEY,
+                    status TEXT,
+                    result INTEGER,
+                    steam_match_id INTEGER,
+                    type TEXT,
+                    created_at TEXT,
+                    archived_at TEXT DEFAULT CURRENT_TIMESTAMP)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ArchivedGamePlayers
+                    (id INTEGER PRIMARY KEY,
+                    game_id INTEGER,
+                    player_id INTEGER,
+                    team INTEGER,
+                    arrived INTEGER,
+                    FOREIGN KEY(game_id) REFERENCES ArchivedGame(id))''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ArchivedGameArgs
+                    (id INTEGER PRIMARY KEY,
+                    game_id INTEGER,
+                    lobby_name TEXT,
+                    lobby_password TEXT,
+                    FOREIGN KEY(game_id) REFERENCES ArchivedGame(id))''')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_archivedgameplayers_game_id ON ArchivedGamePlayers(game_id)')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_archivedgameplayers_player_id ON ArchivedGamePlayers(player_id)')
+    # history across the hot and archived tables
+    cursor.execute('''CREATE VIEW IF NOT EXISTS AllGames AS
+                    SELECT id, status, result, steam_match_id, type, created_at FROM Game
+                    UNION ALL
+                    SELECT id, status, result, steam_match_id, type, created_at FROM ArchivedGame''')
+    cursor.execute('''CREATE VIEW IF NOT EXISTS AllGamePlayers AS
+                    SELECT id, game_id, player_id, team, arrived FROM GamePlayers
+                    UNION ALL
+                    SELECT id, game_id, player_id, team, arrived FROM ArchivedGamePlayers''')
+    cursor.execute('''CREATE VIEW IF NOT EXISTS AllGameArgs AS
+                    SELECT id, game_id, lobby_name, lobby_password FROM GameArgs
+                    UNION ALL
+                    SELECT id, game_id, lobby_name, lobby_password FROM ArchivedGameArgs''')
+
+
+def _add_rating_deviation_columns(cursor: Cursor) -> None:
+    # Glicko-2 state, NULL until the player's first game rated by a model that keeps it
+    columns = [column['name'] for column in cursor.execute('PRAGMA table_info(Players)').fetchall()]
+    if 'rating_deviation' not in columns:
+        cursor.execute('ALTER TABLE Players ADD COLUMN rating_deviation REAL')
+    if 'rating_volatility' not in columns:
+        cursor.execute('ALTER TABLE Players ADD COLUMN rating_volatility REAL')
+
+
+def _add_queue_entries_table(cursor: Cursor) -> None:
+    # the signup queues as of the last journal flush, position orders the players of a queue
+    cursor.execute('''CREATE TABLE IF NOT EXISTS QueueEntries
+                    (queue TEXT,
+                    discord_id INTEGER,
+                    position INTEGER,
+                    PRIMARY KEY(queue, discord_id)) WITHOUT ROWID''')
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Cursor], None]]] = [
+    (1, 'create tables', create_tables),
+    (2, 'add missing Game.type column', _add_game_type_column),
+    (3, 'hot path indexes', _add_hot_path_indexes),
+    (4, 'rating change log', _add_rating_changes_table),
+    (5, 'player stats aggregate', _add_player_stats_table),
+    (6, 'game archive tables and history views', _add_game_archive),
+    (7, 'rating deviation and volatility', _add_rating_deviation_columns),
+    (8, 'signup queue journal', _add_queue_entries_table),
+]
+
+
+def get_schema_version(cursor: Cursor) -> int:
+    cursor.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                    (version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TEXT DEFAULT CURRENT_TIMESTAMP)''')
+    return cursor.execute('SELECT MAX(version) as version FROM schema_version').fetchone()['version'] or 0
+
+
+def apply_migrations() -> int:
+    # a single immediate transaction, concurrent processes wait instead of migrating twice
+    with transaction() as cursor:
+        version = get_schema_version(cursor)
+        for step, description, migration in MIGRATIONS:
+            if step <= version:
+                continue
+            migration(cursor)
+            cursor.execute('INSERT INTO schema_version(version, description) VALUES(?,?)',
+                           (step, description))
+            version = step
+    return version
+
+
+T = TypeVar('T')
+
+# connection pool
+
+
+class ConnectionPool:
+    """
+    Long-lived sqlite connections, one per thread.
+    Connections are opened lazily and configured with the pool's pragmas once,
+    close_all invalidates every connection so threads reconnect on next use.
+    """
+
+    def __init__(self, path: str, uri: bool = False, pragmas: Tuple[str, ...] = CONNECTION_PRAGMAS) -> None:
+        self.path = path
+        self.uri = uri
+        self.pragmas = pragmas
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[Connection] = []
+        self._generation = 0
+
+    def connection(self) -> Connection:
+        conn = getattr(self._local, 'connection', None)
+        if conn is None or self._local.generation != self._generation:
+            conn = self._connect()
+            self._local.connection = conn
+            self._local.generation = self._generation
+        return conn
+
+    def in_transaction(self) -> bool:
+        # without opening a connection for this thread
+        conn = getattr(self._local, 'connection', None)
+        return conn is not None and self._local.generation == self._generation and conn.in_transaction
+
+    def close_all(self) -> None:
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._generation += 1
+
+    def _connect(self) -> Connection:
+        # isolation_level=None, transactions are opened explicitly by transaction()
+        conn = sqlite3.connect(self.path, uri=self.uri, isolation_level=None,
+                               check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = dict_factory
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+
+def _reader_pool(path_file: str) -> ConnectionPool:
+    # mode=ro, a reader can not take the write lock, WAL lets it read while the writers commit
+    return ConnectionPool(path_file + '?mode=ro', uri=True, pragmas=READER_PRAGMAS)
+
+
+_pool = ConnectionPool(DB_PATH)
+_readers = _reader_pool(DB_PATH_FILE)
+
+
+def use_database(path: str) -> None:
+    global DB_PATH, DB_PATH_FILE, _pool, _readers
+    close_connections()
+    DB_PATH = path
+    DB_PATH_FILE = 'file:' + path
+    _pool = ConnectionPool(path)
+    _readers = _reader_pool(DB_PATH_FILE)
+
+
+def close_connections() -> None:
+    _pool.close_all()
+    _readers.close_all()
+
+
+_on_commit = threading.local()  # callbacks of the transaction open on this thread
+
+
+@contextmanager
+def connection() -> Iterator[Cursor]:
+    cursor: Cursor = _pool.connection().cursor()
+    try:
+        yield cursor
+    finally:
+        cursor.close()
 
 
-def execute_function_no_return(function_name: str, *args: Union[str, int]) -> None:
-    conn: Connection = sqlite3.connect(DB_PATH, uri=True)
-    conn.execute('PRAGMA journal_mode=WAL')
+@contextmanager
+def read_connection() -> Iterator[Cursor]:
+    """
+    Cursor on the read only connection of this thread.
+    Inside an open transaction it stays on the write connection, to see the uncommitted writes.
+    """
+    conn = _pool.connection() if _pool.in_transaction() else _readers.connection()
     cursor: Cursor = conn.cursor()
-    function = globals()[function_name]
-    for _ in range(5):
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+
+
+@contextmanager
+def transaction() -> Iterator[Cursor]:
+    """
+    Runs the block in a single write transaction on the pooled connection.
+    Commits on success, rolls back on any exception.
+    Nested use joins the already open transaction.
+    """
+    conn = _pool.connection()
+    cursor: Cursor = conn.cursor()
+    if conn.in_transaction:
         try:
-            function(cursor, *args)
-            if cursor.rowcount <= 0:
-                conn.close()
-                raise DataBaseErrorNonModified('No rows updated')
-            conn.commit()
-            conn.close()
-            return
+            yield cursor
+        finally:
+            cursor.close()
+        return
+    cursor.execute('BEGIN IMMEDIATE')
+    _on_commit.callbacks = []
+    try:
+        yield cursor
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    else:
+        conn.execute('COMMIT')
+        callbacks = _on_commit.callbacks
+        _on_commit.callbacks = None
+        for callback in callbacks:
+            callback()
+    finally:
+        _on_commit.callbacks = None
+        cursor.close()
+
+
+def after_commit(callback: Callable[[], Any]) -> None:
+    """
+    Runs callback once the open transaction commits, it is dropped if the transaction rolls back.
+    Keeps in memory state in line with what was actually written. Outside a transaction it runs now.
+    """
+    callbacks = getattr(_on_commit, 'callbacks', None)
+    if callbacks is None:
+        callback()
+    else:
+        callbacks.append(callback)
+
+# lock contention
+
+
+def _is_locked(error: sqlite3.OperationalError) -> bool:
+    return 'database is locked' in str(error) or 'database is busy' in str(error)
+
+
+def backoff_delay(attempt: int) -> float:
+    # full jitter, spreads retries of the bot, orchestrator and lobby processes apart
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+_contention_lock = threading.Lock()
+_contention: Dict[str, Dict[str, float]] = {}
+
+
+def _record_contention(function_name: str, waited: float, failed: bool = False) -> None:
+    with _contention_lock:
+        stats = _contention.setdefault(
+            function_name, {'retries': 0, 'wait_time': 0.0, 'failures': 0})
+        stats['wait_time'] += waited
+        if failed:
+            stats['failures'] += 1
+        else:
+            stats['retries'] += 1
+
+
+def get_contention_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Returns retries, seconds spent waiting on locks and exhausted retries per query function.
+    """
+    with _contention_lock:
+        return {name: dict(stats) for name, stats in _contention.items()}
+
+
+def reset_contention_stats() -> None:
+    with _contention_lock:
+        _contention.clear()
+
+
+def with_retry(function_name: str, attempt: Callable[..., T], *args: Any) -> T:
+    for n in range(LOCK_RETRIES):
+        started = time.monotonic()
+        try:
+            return attempt(*args)
         except sqlite3.OperationalError as e:
-            if 'database is locked' in str(e):
-                asyncio.sleep(0.2)
-            else:
-                conn.close()
+            if not _is_locked(e):
                 raise e
-
+            if n == LOCK_RETRIES - 1:
+                _record_contention(function_name, time.monotonic() - started, failed=True)
+                break
+            time.sleep(backoff_delay(n))
+            _record_contention(function_name, time.monotonic() - started)
     raise sqlite3.OperationalError('Database is busy')
 
 
-def execute_insert_and_return_id(function_name: str, *args: Union[str, int]) -> int:
-    conn: Connection = sqlite3.connect(DB_PATH, uri=True)
-    conn.execute('PRAGMA journal_mode=WAL')
-    conn.row_factory = dict_factory
-    cursor: Cursor = conn.cursor()
-    function = globals()[function_name]
-    for _ in range(5):
+async def with_retry_async(function_name: str, attempt: Callable[..., T], *args: Any) -> T:
+    # each attempt runs on the executor, the backoff is awaited so no worker thread sleeps
+    for n in range(LOCK_RETRIES):
+        started = time.monotonic()
         try:
-            function(cursor, *args)
-            id = cursor.lastrowid
-            if not id:
-                conn.close()
-                raise ValueError('No rows found')
-            conn.commit()
-            conn.close()
-            return id
+            return await run_blocking(attempt, *args)
         except sqlite3.OperationalError as e:
-            if 'database is locked' in str(e):
-                asyncio.sleep(0.2)
-            else:
-                conn.close()
+            if not _is_locked(e):
                 raise e
+            if n == LOCK_RETRIES - 1:
+                _record_contention(function_name, time.monotonic() - started, failed=True)
+                break
+            await asyncio.sleep(backoff_delay(n))
+            _record_contention(function_name, time.monotonic() - started)
     raise sqlite3.OperationalError('Database is busy')
 
 
-def execute_function_single_row_return(function_name: str, *args: Union[str, int]) -> Any:
-    conn: Connection = sqlite3.connect(DB_PATH, uri=True)
-    conn.execute('PRAGMA journal_mode=WAL')
-    conn.row_factory = dict_factory
-    cursor: Cursor = conn.cursor()
-    function = globals()[function_name]
-    function(cursor, *args)
-    result = cursor.fetchone()
-    conn.close()
-    if not result:
-        raise ValueError('No rows found')
-    return result
-
-
-def execute_function_with_return(function_name: str, *args: Union[str, int]) -> list[Any]:
-    conn: Connection = sqlite3.connect(DB_PATH, uri=True)
-    conn.execute('PRAGMA journal_mode=WAL')
-    conn.row_factory = dict_factory
-    cursor: Cursor = conn.cursor()
-    function = globals()[function_name]
-    function(cursor, *args)
-    result = cursor.fetchall()
-    if not result:
-        raise ValueError('No rows found')
-    return result
+# async wrappers, queries run on a dedicated executor so the event loop never waits on disk
+
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix='discord_db')
 
 
-# database generic querys
-def custom_query(cursor: Cursor, query: str) -> None:
-    cursor.execute(query)
+async def run_blocking(function: Callable[..., T], *args: Any) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, function, *args)
 
 
 # maintenance functions
 def ensure_database_exists() -> None:
-    if not os.path.exists(DB_PATH):
+    new_database = not os.path.exists(DB_PATH)
+    if new_database:
         open(DB_PATH, 'w').close()
-        try:
-            execute_function_no_return('create_tables')
-        except DataBaseErrorNonModified:
-            pass
+    apply_migrations()
+    if new_database:
         register_steam_bots()
 
 
-def recalculate_mmr() -> None:
-    execute_function_no_return('reset_all_player_mmr')
-    games = execute_function_with_return('get_games_where_status_over')
-    for game in games:
-        players = execute_function_with_return(
-            'get_all_players_from_game', game['id'])
-        radian_players = [player for player in players if player['team'] == 0]
-        dire_players = [player for player in players if player['team'] == 1]
-        radian_players_avg_mmr = sum(
-            [player['mmr'] for player in radian_players]) / len(radian_players)
-        dire_players_avg_mmr = sum(
-            [player['mmr'] for player in dire_players]) / len(dire_players)
-        elo_change = calculate_elo(
-            radian_players_avg_mmr, dire_players_avg_mmr, 1 if game['result'] == 0 else -1)
-        for player in players:
-            if player['team'] == game['result']:
-                execute_function_no_return(
-                    'update_player_mmr_won', player['id'], elo_change)
-            else:
-                execute_function_no_return(
-                    'update_player_mmr_lost', player['id'], elo_change)
-
-
-def reset_league() -> None:
-    execute_function_no_return('custom_query', 'DELETE FROM Game')
-    execute_function_no_return('custom_query', 'DELETE FROM GamePlayers')
-    execute_function_no_return('custom_query', 'DELETE FROM GameArgs')
-    execute_function_no_return('reset_all_player_mmr')
-
-
 def register_steam_bots() -> None:
     with open(STEAM_ACCOUNTS_PATH) as f:
         bots = json.load(f)
     if len(bots) == 0:
         raise ValueError('No steam bots found, Please add them to steam_bot_acc.json')
-    for bot in bots:
-        try:
-            execute_function_single_row_return(
-                'add_bot', bot['username'], bot['password'])
-        except ValueError:
-            execute_function_no_return(
-                'add_bot', bot['username'], bot['password'])
-
-
-def print_data_base(filter: List[str] = []):
-    conn = sqlite3.connect(DB_PATH, uri=True)
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = cursor.fetchall()
-    for table in tables:
-        if table[0] not in filter:
-            cursor.execute(f"SELECT * FROM {table[0]}")
-            rows = cursor.fetchall()
-            print(f"{table[0]}:")
-            if len(rows) > 0:
-                column_names = [description[0]
-                                for description in cursor.description]
-                print(column_names)
-                for row in rows:
-                    print(row)
-            else:
-                print("Table is empty")
-    conn.close()
+    with transaction() as cursor:
+        cursor.executemany('INSERT INTO SteamBots(username, password, status) VALUES(?,?,0)',
+                           [(bot['username'], bot['password']) for bot in bots])
+
+
+# backups
+
+
+def backup_dir() -> str:
+    return os.path.join(os.path.dirname(DB_PATH), BACKUP_DIR_NAME)
+
+
+def backup_database(label: str = '', keep: int = BACKUP_RETENTION) -> str:
+    """
+    Writes a consistent snapshot of the live database with the sqlite online backup api,
+    verifies it and drops the oldest snapshots beyond keep. Returns the snapshot path.
+    """
+    if not os.path.exists(DB_PATH):
+        raise ValueError(f'{DB_PATH} does not exist')
+    os.makedirs(backup_dir(), exist_ok=True)
+    name = os.path.splitext(os.path.basename(DB_PATH))[0]
+    timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    path = os.path.join(backup_dir(), f'{name}-{timestamp}{"-" + label if label else ""}.db')
+    partial = path + '.partial'
+    source = sqlite3.connect(DB_PATH_FILE + '?mode=ro', uri=True)
+    target = sqlite3.connect(partial)
+    try:
+        source.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        # the source is read in a new read transaction per step, under WAL writers keep committing
+        source.backup(target, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP)
+        target.execute('PRAGMA journal_mode=DELETE')  # a snapshot is a single self contained file
+    finally:
+        target.close()
+        source.close()
+    try:
+        verify_snapshot(partial)
+    except ValueError:
+        os.remove(partial)
+        raise
+    os.replace(partial, path)
+    rotate_backups(keep)
+    return path
+
+
+def list_backups() -> List[str]:
+    # oldest first, the timestamp in the name sorts them
+    name = os.path.splitext(os.path.basename(DB_PATH))[0]
+    return sorted(glob.glob(os.path.join(backup_dir(), f'{name}-*.db')))
+
+
+def rotate_backups(keep: int = BACKUP_RETENTION) -> List[str]:
+    """
+    Deletes all but the newest keep snapshots, returns the deleted paths.
+    """
+    snapshots = list_backups()
+    expired = snapshots[:max(len(snapshots) - keep, 0)]
+    for path in expired:
+        os.remove(path)
+    return expired
+
+
+def verify_snapshot(path: str) -> int:
+    """
+    Checks the snapshot is an intact league database this code can migrate.
+    Returns its schema version, raises ValueError otherwise.
+    """
+    if not os.path.exists(path):
+        raise ValueError(f'{path} does not exist')
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        integrity = conn.execute('PRAGMA integrity_check').fetchone()[0]
+        if integrity != 'ok':
+            raise ValueError(f'{path} is corrupt: {integrity}')
+        version = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f'{path} is not a league database: {e}') from e
+    finally:
+        conn.close()
+    if version > MIGRATIONS[-1][0]:
+        raise ValueError(f'{path} has schema version {version}, newer than this code ({MIGRATIONS[-1][0]})')
+    return version
+
+
+def restore_database(path: str) -> str:
+    """
+    Replaces the live database with a verified snapshot, after taking a pre-restore snapshot.
+    The copy is one backup step so other processes see either the old or the restored database.
+    Returns the pre-restore snapshot path. Processes holding caches (the bot) need a restart.
+    """
+    verify_snapshot(path)
+    safety = backup_database('pre-restore', keep=BACKUP_RETENTION + 1)
+    source = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    target = sqlite3.connect(DB_PATH)
+    try:
+        target.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    close_connections()
+    apply_migrations()  # an older snapshot is brought up to the current schema
+    verify_snapshot(DB_PATH)
+    return safety
 
 
 if __name__ == '__main__':
-    ensure_database_exists()
-    print_data_base()
+    parser = argparse.ArgumentParser(description='League database maintenance')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('migrate', help='create or migrate the database (default), dump.py exports it')
+    backup_parser = commands.add_parser('backup', help='take an online snapshot')
+    backup_parser.add_argument('--keep', type=int, default=BACKUP_RETENTION, help='snapshots kept by rotation')
+    commands.add_parser('backups', help='list snapshots')
+    restore_parser = commands.add_parser('restore', help='restore a verified snapshot')
+    restore_parser.add_argument('snapshot')
+    args = parser.parse_args()
+
+    if args.command == 'backup':
+        print(backup_database(keep=args.keep))
+    elif args.command == 'backups':
+        for snapshot in list_backups():
+            print(snapshot)
+    elif args.command == 'restore':
+        print(f'Restored {args.snapshot}, previous database saved to {restore_database(args.snapshot)}')
+    else:
+        ensure_database_exists()
+        with connection() as cursor:
+            print(f'{DB_PATH} at schema version {get_schema_version(cursor)}')
@@ -0,0 +1,198 @@
+"""
+Streaming export and bulk import of the league tables, for inspection, staging and benchmark
+databases. Rows are read with fetchmany and written chunk by chunk, memory stays flat with
+the size of the database.
+
+    python dump.py export OUT_DIR [--format jsonl|csv|columns] [--tables ...] [--exclude ...] [--since GAME_ID]
+    python dump.py import IN_DIR [--db PATH]
+
+Formats, one file per table next to a manifest.json:
+    jsonl    one JSON object per row
+    csv      header then rows, NULL written as \\N
+    columns  one JSON object per chunk with a list of values per column
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import discord_db as db
+
+FORMATS = ('jsonl', 'csv', 'columns')
+EXTENSIONS = {'jsonl': '.jsonl', 'csv': '.csv', 'columns': '.columns.jsonl'}
+CHUNK_SIZE = 5000  # rows per fetchmany, per columns chunk and per import transaction
+CSV_NULL = '\\N'
+# bot passwords and the transient signup queues, export them only when asked for by name
+EXCLUDED_BY_DEFAULT = ('SteamBots', 'QueueEntries')
+GAME_TABLES = {'Game': 'id', 'ArchivedGame': 'id'}  # --since filters these on id, others on game_id
+
+
+def list_tables(conn: sqlite3.Connection) -> List[str]:
+    rows = conn.execute('''SELECT name FROM sqlite_master WHERE type = 'table'
+                           AND name NOT LIKE 'sqlite_%' AND name <> 'schema_version' ORDER BY rowid''')
+    return [row[0] for row in rows]
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def table_order(conn: sqlite3.Connection, table: str) -> str:
+    # the primary key columns, rowid for tables without one, WITHOUT ROWID tables always have one
+    key = sorted((row[5], row[1]) for row in conn.execute(f'PRAGMA table_info("{table}")') if row[5] > 0)
+    return ', '.join(column for _, column in key) or 'rowid'
+
+
+def iter_chunks(conn: sqlite3.Connection, sql: str, args: Sequence[Any] = (),
+                size: int = CHUNK_SIZE) -> Iterator[List[tuple]]:
+    cursor = conn.execute(sql, args)
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def _select(table: str, columns: List[str], order: str, since: Optional[int]) -> Tuple[str, Tuple[Any, ...]]:
+    sql = f'SELECT {", ".join(columns)} FROM "{table}"'
+    key = GAME_TABLES.get(table, 'game_id' if 'game_id' in columns else None)
+    if since is None or key is None:
+        return sql + f' ORDER BY {order}', ()
+    return sql + f' WHERE {key} > ? ORDER BY {order}', (since, )
+
+
+def export_database(out_dir: str, format: str = 'jsonl', tables: Optional[List[str]] = None,
+                    exclude: Sequence[str] = (), since: Optional[int] = None,
+                    chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Writes the tables to out_dir, all of them but EXCLUDED_BY_DEFAULT when tables is None.
+    With since only rows of games after that game id are written for game scoped tables.
+    Reads one consistent snapshot. Returns the manifest.
+    """
+    if format not in FORMATS:
+        raise ValueError(f'Unknown format {format}, use one of {", ".join(FORMATS)}')
+    os.makedirs(out_dir, exist_ok=True)
+    conn = sqlite3.connect(db.DB_PATH_FILE + '?mode=ro', uri=True)
+    conn.execute('BEGIN')  # one read transaction, every table from the same snapshot
+    try:
+        existing = list_tables(conn)
+        if tables is None:
+            tables = [table for table in existing if table not in EXCLUDED_BY_DEFAULT]
+        unknown = [table for table in tables if table not in existing]
+        if unknown:
+            raise ValueError(f'No such tables: {", ".join(unknown)}')
+        manifest: Dict[str, Any] = {
+            'schema_version': conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0],
+            'format': format, 'since': since, 'tables': {}}
+        for table in tables:
+            if table in exclude:
+                continue
+            columns = table_columns(conn, table)
+            sql, args = _select(table, columns, table_order(conn, table), since)
+            path = os.path.join(out_dir, table + EXTENSIONS[format])
+            rows = _write_table(path, format, columns, iter_chunks(conn, sql, args, chunk_size))
+            manifest['tables'][table] = {'columns': columns, 'rows': rows}
+    finally:
+        conn.close()
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _write_table(path: str, format: str, columns: List[str], chunks: Iterator[List[tuple]]) -> int:
+    count = 0
+    with open(path, 'w', newline='') as f:
+        if format == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(columns)
+        for rows in chunks:
+            count += len(rows)
+            if format == 'jsonl':
+                f.writelines(json.dumps(dict(zip(columns, row))) + '\n' for row in rows)
+            elif format == 'csv':
+                writer.writerows([CSV_NULL if value is None else value for value in row] for row in rows)
+            else:
+                f.write(json.dumps({column: list(values) for column, values in zip(columns, zip(*rows))}) + '\n')
+    return count
+
+
+def read_table(path: str, format: str, columns: List[str],
+               chunk_size: int = CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Yields chunks of row tuples in the order of columns from an exported table file.
+    """
+    with open(path, newline='') as f:
+        if format == 'columns':
+            for line in f:
+                chunk = json.loads(line)
+                yield list(zip(*(chunk[column] for column in columns)))
+            return
+        if format == 'csv':
+            reader = csv.reader(f)
+            header = next(reader)
+            positions = [header.index(column) for column in columns]
+            rows = ([None if row[i] == CSV_NULL else row[i] for i in positions] for row in reader)
+        else:
+            rows = ([record[column] for column in columns] for record in map(json.loads, f))
+        chunk: List[tuple] = []
+        for row in rows:
+            chunk.append(tuple(row))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def import_database(in_dir: str, chunk_size: int = CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Loads an export into the current database, migrating it first. Rows replace rows with the
+    same id, so incremental exports can be applied on top of a full one.
+    Each chunk is one transaction. Returns the imported row count per table.
+    """
+    with open(os.path.join(in_dir, 'manifest.json')) as f:
+        manifest = json.load(f)
+    db.ensure_database_exists()
+    imported = {}
+    for table, exported in manifest['tables'].items():
+        with db.connection() as cursor:
+            present = {column['name'] for column in cursor.execute(f'PRAGMA table_info("{table}")')}
+        if not present:
+            raise ValueError(f'Table {table} does not exist in {db.DB_PATH}')
+        columns = [column for column in exported['columns'] if column in present]
+        sql = f'INSERT OR REPLACE INTO "{table}"({", ".join(columns)}) VALUES({", ".join("?" * len(columns))})'
+        path = os.path.join(in_dir, table + EXTENSIONS[manifest['format']])
+        imported[table] = 0
+        for rows in read_table(path, manifest['format'], columns, chunk_size):
+            with db.transaction() as cursor:
+                cursor.executemany(sql, rows)
+            imported[table] += len(rows)
+    return imported
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export and import the league database')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='write the tables to a directory')
+    export_parser.add_argument('out_dir')
+    export_parser.add_argument('--format', choices=FORMATS, default='jsonl')
+    export_parser.add_argument('--tables', nargs='+', help=f'default all but {", ".join(EXCLUDED_BY_DEFAULT)}')
+    export_parser.add_argument('--exclude', nargs='+', default=[])
+    export_parser.add_argument('--since', type=int, help='only games after this game id')
+    import_parser = commands.add_parser('import', help='load an export')
+    import_parser.add_argument('in_dir')
+    import_parser.add_argument('--db', help=f'database to load into, default {db.DB_PATH}')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        manifest = export_database(args.out_dir, args.format, args.tables, args.exclude, args.since)
+        for table, exported in manifest['tables'].items():
+            print(f'{table}: {exported["rows"]} rows')
+    else:
+        if args.db:
+            db.use_database(args.db)
+        for table, rows in import_database(args.in_dir).items():
+            print(f'{table}: {rows} rows')
@@ -0,0 +1,82 @@
+"""
+Standings of players who finished a game, kept in memory.
+Loaded with one query on first use and updated from committed mmr changes, so leaderboard
+refreshes cost no queries and a rank lookup is a bisect over the ordered standings.
+"""
+import threading
+
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models.records import Player
+from queries import Row, get_leaderboards
+
+
+class Leaderboard:
+    """
+    Players ordered by mmr, highest first. Rank is one more than the number of players with a
+    higher mmr, ties share a rank. Players join the standings with their first scored game.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._players: Dict[int, Player] = {}  # with id, discord_id and mmr
+        self._order: List[Tuple[int, int]] = []  # (-mmr, player id) ascending, the standings order
+
+    def standings(self) -> List[Player]:
+        """
+        The records are shared with the cache, read them only.
+        """
+        with self._lock:
+            self._load_if_needed()
+            return [self._players[player_id] for _, player_id in self._order]
+
+    def rank(self, player_id: int) -> Optional[int]:
+        """
+        Returns None when the player has not finished a game.
+        """
+        with self._lock:
+            self._load_if_needed()
+            player = self._players.get(player_id)
+            if player is None:
+                return None
+            return bisect_left(self._order, (-player.mmr, )) + 1
+
+    def update(self, changes: Iterable[Row]) -> None:
+        """
+        Moves every player in changes (rows with id, discord_id and mmr) to their new place.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            for change in changes:
+                self._set(change['id'], change['discord_id'], change['mmr'])
+
+    def invalidate(self) -> None:
+        # the next lookup reloads, for bulk changes like recalculate_mmr and reset_league
+        with self._lock:
+            self._loaded = False
+
+    def _load_if_needed(self) -> None:
+        if self._loaded:
+            return
+        try:
+            players = get_leaderboards()
+        except ValueError:
+            players = []
+        self._players = {player.id: player for player in players}
+        self._order = sorted((-player.mmr, player.id) for player in players)
+        self._loaded = True
+
+    def _set(self, player_id: int, discord_id: int, mmr: int) -> None:
+        old = self._players.get(player_id)
+        if old is not None:
+            if old.mmr == mmr:
+                return
+            del self._order[bisect_left(self._order, (-old.mmr, player_id))]
+        insort(self._order, (-mmr, player_id))
+        self._players[player_id] = Player(id=player_id, discord_id=discord_id, mmr=mmr)
+
+
+leaderboard = Leaderboard()
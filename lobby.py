@@ -7,7 +7,10 @@ from steam.client import SteamID
 from steam.client import SteamClient
 from dota2.client import Dota2Client
 
-from discord_db import execute_function_single_row_return, execute_function_no_return, execute_function_with_return
+from queries import (
+    free_bot, get_all_players_from_game, get_game, get_game_args, get_steam_bot,
+    set_game_status_aborted, set_game_status_hosted, set_game_status_started,
+    set_game_status_timeout, set_player_arrived, set_player_left)
 
 
 steam_client = SteamClient()
@@ -21,15 +24,15 @@ def lobby_change(lobby):
     if starting:
         return
     for lobby_player in lobby.all_members:
-        player = next((p for p in players if p['steam_id'] == lobby_player.id), None)
+        player = next((p for p in players if p.steam_id == lobby_player.id), None)
         if player is not None:
             old_checkin = players_that_checkin[lobby_player.id]
-            players_that_checkin[lobby_player.id] =  player['team'] == lobby_player.team
+            players_that_checkin[lobby_player.id] =  player.team == lobby_player.team
             if old_checkin != players_that_checkin[lobby_player.id]:
                 if players_that_checkin[lobby_player.id]:
-                    execute_function_no_return('set_player_arrived', game_id, player['id'])
+                    set_player_arrived(game_id, player.id)
                 else:
-                    execute_function_no_return('set_player_left', game_id, player['id'])
+                    set_player_left(game_id, player.id)
         check_to_start()
 
 def create_lobby():
@@ -50,7 +53,7 @@ def create_lobby():
     gevent.spawn_later(lobby_timeout, timeout_game) #abort game in 5 minutes if not started
 
 def invite_players():
-    for player in (SteamID(p['steam_id']) for p in players):
+    for player in (SteamID(p.steam_id) for p in players):
         dota_client.invite_to_lobby(player)
     _log('Invited playes')
 
@@ -64,8 +67,8 @@ def check_to_start():
         _log('Disconnecting from lobby')
         dota_client.abandon_current_game()
         steam_client_logout()
-        execute_function_no_return('set_game_status_started', game_id)
-        execute_function_no_return('free_bot', steam_bot['username'])
+        set_game_status_started(game_id)
+        free_bot(steam_bot.username)
         exit(0)
 
 def destrony_lobby():
@@ -79,16 +82,16 @@ def steam_client_logout():
 def cleanup():
     destrony_lobby()
     steam_client_logout()
-    execute_function_no_return('free_bot', steam_bot["username"])
+    free_bot(steam_bot["username"])
 
 def abort_game():
     cleanup()
-    execute_function_no_return('set_game_status_aborted', game_id)
+    set_game_status_aborted(game_id)
     exit(1)
 
 def timeout_game():
     cleanup()
-    execute_function_no_return('set_game_status_timeout', game_id)
+    set_game_status_timeout(game_id)
     exit(1)
 
 def _log(message, level='BOT '):
@@ -107,21 +110,21 @@ if __name__ == '__main__':
     game_mod = int(sys.argv[4])
     lobby_timeout = int(sys.argv[5])
 
-    steam_bot  = execute_function_single_row_return('get_steam_bot', steam_bot_id)
-    game_args = execute_function_single_row_return('get_game_args', game_id)
+    steam_bot  = get_steam_bot(steam_bot_id)
+    game_args = get_game_args(game_id)
     lobby_name = game_args['lobby_name']  #type: ignore
     lobby_password = game_args['lobby_password']  #type: ignore
     
-    players  = execute_function_with_return('get_all_players_from_game', game_id)
+    players  = get_all_players_from_game(game_id)
     players_that_checkin = {}
     for player in players:
-        players_that_checkin[player['steam_id']] = False
+        players_that_checkin[player.steam_id] = False
 
-    _log('Logging in as {}'.format(steam_bot['username']))
-    result = steam_client.login(username=steam_bot['username'], password= steam_bot['password'])
+    _log('Logging in as {}'.format(steam_bot.username))
+    result = steam_client.login(username=steam_bot.username, password= steam_bot.password)
     if result != EResult.OK:
         _log('Steam login failed with result {}'.format(result))
-        execute_function_no_return('free_bot', steam_bot['username'])
+        free_bot(steam_bot.username)
         exit(1)
             
     _log('Login successfull')
@@ -133,16 +136,16 @@ if __name__ == '__main__':
         dota_client.wait_event('ready', timeout=20, raises=True)
         _log('Dota2 ready')
     except gevent.Timeout:
-        execute_function_no_return('free_bot', steam_bot['username'])
+        free_bot(steam_bot.username)
         exit(1)
     try:
         starting = False
         create_lobby()
         invite_players()
-        execute_function_no_return('set_game_status_hosted', game_id)
+        set_game_status_hosted(game_id)
         while True:
-            game = execute_function_single_row_return('get_game', game_id)
-            if game['status'] == 'CANCEL':
+            game = get_game(game_id)
+            if game.status == 'CANCEL':
                 abort_game()
             gevent.sleep(15)
     except Exception as e:
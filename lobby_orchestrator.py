@@ -4,7 +4,9 @@ import datetime
 import yaml
 import sys
 
-from discord_db import execute_function_single_row_return, execute_function_no_return
+from queries import (
+    get_free_bot, get_game_id_where_status_pregame, get_game_id_where_status_rehost, reserve_bot,
+    set_game_status_pregame)
 
 yaml_path = 'league_settings_dev.yaml' if len(
     sys.argv) > 1 and sys.argv[1] == 'dev' else 'league_settings.yaml'
@@ -24,26 +26,26 @@ while True:
     time.sleep(10)
     _log('Looking for games...')
     try:
-        id = execute_function_single_row_return('get_game_id_where_status_pregame')['id']
+        id = get_game_id_where_status_pregame()['id']
     except ValueError:
         id = None
     if id:
         _log('Found game, getting ready')
         try:
-            bot = execute_function_single_row_return('get_free_bot')
-            execute_function_no_return('reserve_bot', bot['id'])
-            lobby_process = subprocess.Popen(['python', 'lobby.py', str(id), str(bot['id']), str(league_id), str(game_mod), str(lobby_timeout)],
+            bot = get_free_bot()
+            reserve_bot(bot.id)
+            lobby_process = subprocess.Popen(['python', 'lobby.py', str(id), str(bot.id), str(league_id), str(game_mod), str(lobby_timeout)],
                              creationflags=subprocess.CREATE_NEW_PROCESS_GROUP)
             
         except ValueError:
             _log('No bot to run the game, waiting...')
             continue
     try: 
-        rehost_id = execute_function_single_row_return('get_game_id_where_status_rehost')['id']
+        rehost_id = get_game_id_where_status_rehost()['id']
     except ValueError:
         rehost_id = None
     if rehost_id:
-        execute_function_no_return('set_game_status_pregame', rehost_id)
+        set_game_status_pregame(rehost_id)
 
 
 
@@ -1,8 +1,10 @@
 import os
+import json
 import datetime
 import d2api
 import time
 import sys
+import sqlite3
 import asyncio
 import yaml
 
@@ -14,12 +16,26 @@ from dotenv import load_dotenv
 from typing import Any, List, Union
 from more_itertools import chunked
 
-from discord_db import execute_function_no_return, execute_function_single_row_return, execute_insert_and_return_id, execute_function_with_return
+import discord_db as db
+from queries import (
+    add_player, create_game_with_players, delete_player_roles, get_active_games, get_all_players,
+    get_all_players_from_game, get_game, get_game_where_status_timeout, get_player, get_player_id,
+    get_player_stats, get_players_arrived, get_players_by_ids, get_roles_of_players,
+    get_scored_games_with_steam_match_id, reset_all_players_arrived, set_game_status_aborted,
+    set_game_status_cancel, set_game_status_rehost, set_player_captain, set_player_role)
 from models.console import ConsoleView
-from models.errors import DataBaseErrorNonModified
+from models.errors import DataBaseErrorNonModified, GameAlreadyScored
 from models.player import Player
-from utility import get_random_password, balanced_shuffle, calculate_elo, split_digits
-from models.draft import DraftView
+from models.queue import PlayerQueue, exclusive
+from queue_journal import FLUSH_INTERVAL, QueueJournal
+from player_cache import CACHE_TTL, PlayerIdCache
+from leaderboard import leaderboard
+from utility import get_random_password, balanced_shuffle, split_digits
+from scoring import rebuild_player_stats, score_game_result
+from rating import make_model, use_model
+from archive import archive_games
+from matchmaker import partition_lobbies
+from models.draft import DraftView, get_players_from_db
 
 env_path = '.dev.env' if len(sys.argv) > 1 and sys.argv[1] == 'dev' else '.env'
 load_dotenv(os.path.join(os.path.abspath(os.path.dirname(__file__)), env_path))
@@ -33,6 +49,13 @@ with open(yaml_path) as f:
     ADMIN_ROLE = league_settings.get('discord_league_admin_role_name', '')
     STARTING_MMR = league_settings.get('league_starting_mmr', 1000)
     LOBBY_SIZE = league_settings.get('lobby_size', 10)
+    ARCHIVE_AFTER_DAYS = league_settings.get('archive_after_days', 30)
+    BALANCE_ROLES = league_settings.get('balance_roles', False)
+    MATCHMAKING_WINDOW = league_settings.get('matchmaking_window', 5)
+    RATING_MODEL = league_settings.get('rating_model', 'elo')
+    ELO_K_FACTOR = league_settings.get('elo_k_factor', 50)
+
+use_model(make_model(RATING_MODEL, ELO_K_FACTOR))
 
 TOKEN: str = os.getenv('TOKEN', '')
 STEAM_API_TOKEN = os.getenv('STEAM_API_TOKEN', '')
@@ -46,10 +69,13 @@ CONSOLE_CHANNEL_ID : Union[str, None]= os.getenv('CONSOLE_CHANNEL_ID', None)
 
 
 PREFIX = '!'
+ARCHIVE_INTERVAL = 24 * 60 * 60  # seconds
+EMBED_MAX_FIELDS = 25  # discord rejects embeds with more
 SKIP_GAMES = []  # Used when the same league was used for testing or previous season
 
 RENDER = {'leaderboard': False, 'queue': False, 'queue_draft': False}
 AUTO_SCORING_IN_PROGRESS = False
+MATCHMAKING_TASK = None  # the batch waiting out MATCHMAKING_WINDOW
 
 async def update_embed_loop(callback, flag):
     global RENDER
@@ -59,29 +85,56 @@ async def update_embed_loop(callback, flag):
             RENDER[flag] = False
         await asyncio.sleep(5)
 
+async def _archive_old_games():
+    while True:
+        try:
+            archived = await db.run_blocking(archive_games, ARCHIVE_AFTER_DAYS)
+            if archived > 0:
+                _log(f'Archived {archived} games')
+        except sqlite3.Error as e:
+            _log(f'Archiving failed: {e}', 'ERROR   ')
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+async def _flush_queue_journal():
+    # the signups of the last interval in one commit, a failed batch stays pending for the next one
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        try:
+            await QUEUE_JOURNAL.flush_async()
+        except sqlite3.Error as e:
+            _log(f'Queue journal flush failed: {e}', 'ERROR   ')
+
+async def _reload_player_ids():
+    # players vouched or removed by other processes show up within CACHE_TTL
+    while True:
+        await asyncio.sleep(CACHE_TTL)
+        try:
+            await bot.player_ids.reload()  # type: ignore
+        except sqlite3.Error as e:
+            _log(f'Reloading player ids failed: {e}', 'ERROR   ')
+
+
 async def _look_for_timeout_games():
     global RENDER
     while True:
         try:
-            games = execute_function_with_return('get_game_where_status_timeout')
+            games = await get_game_where_status_timeout.run_async()
         except ValueError:
             games = []
         for game in games:
             try:
-                players = execute_function_with_return('get_players_arrived', game['id'])
+                players = await get_players_arrived.run_async(game.id)
             except ValueError:
                 players = []
-            if game['type'] == 'DRAFT':
+            if game.type == 'DRAFT':
                 RENDER['queue_draft'] = True
-                returning_players = [Player(player['id']) for player in players if player['id'] not in [player.id for player in bot.sigedUpDraftPlayerPool]]
-                bot.sigedUpDraftPlayerPool = returning_players + bot.sigedUpDraftPlayerPool
+                bot.sigedUpDraftPlayerPool.return_to_front(Player(player['id']) for player in players)
                 await _check_pool_size_and_start_draft()
             else:
                 RENDER['queue'] = True
-                returning_players = [Player(player['id']) for player in players if player['id'] not in [player.id for player in bot.sigedUpPlayerPool]]
-                bot.sigedUpPlayerPool = returning_players + bot.sigedUpPlayerPool
+                bot.sigedUpPlayerPool.return_to_front(Player(player['id']) for player in players)
                 await _check_pool_size_and_start()
-            execute_function_no_return('set_game_status_aborted', game['id'])
+            await set_game_status_aborted.run_async(game.id)
         await asyncio.sleep(5)
         
 
@@ -94,8 +147,12 @@ bot = Bot(
     help_command=None,
 )
 
-bot.sigedUpPlayerPool: List[Member] = []  # type: ignore
-bot.sigedUpDraftPlayerPool: List[Member] = []  # type: ignore
+bot.sigedUpPlayerPool = PlayerQueue('normal')  # type: ignore
+bot.sigedUpDraftPlayerPool = PlayerQueue('draft')  # type: ignore
+exclusive(bot.sigedUpPlayerPool, bot.sigedUpDraftPlayerPool)  # type: ignore
+QUEUE_JOURNAL = QueueJournal()
+QUEUE_JOURNAL.attach(bot.sigedUpPlayerPool, bot.sigedUpDraftPlayerPool)  # type: ignore
+bot.player_ids = PlayerIdCache()  # type: ignore
 
 
 @bot.event
@@ -126,7 +183,13 @@ async def on_ready():
     asyncio.ensure_future(update_embed_loop(_update_queue, 'queue'))
     asyncio.ensure_future(update_embed_loop(_update_draft_queue, 'queue_draft'))
     asyncio.ensure_future(_look_for_timeout_games())
+    asyncio.ensure_future(_archive_old_games())
+    asyncio.ensure_future(_flush_queue_journal())
+    asyncio.ensure_future(_reload_player_ids())
     _log(f'Logged in as {bot.user}')
+    # a restart inside the matchmaking window leaves full lobbies in the restored queues
+    await _check_pool_size_and_start()
+    await _check_pool_size_and_start_draft()
 
 
 @bot.event
@@ -173,6 +236,10 @@ async def help(ctx: Context):
                         value="Clear the queue", inline=False)
         embed.add_field(name="/cancelgame MatchNumber", value="Cancel a game", inline=False)
         embed.add_field(name="/markcaptain @DiscordUser", value="Mark a player as captain", inline=False)
+        embed.add_field(name="/dbstats", value="Show database lock contention per query", inline=False)
+        embed.add_field(name="/rebuildstats", value="Rebuild player stats from the game history", inline=False)
+        embed.add_field(name="/backup", value="Take a snapshot of the league database", inline=False)
+        embed.add_field(name="/archive [days]", value="Archive aborted and canceled games older than days", inline=False)
 
     await ctx.send(embed=embed, delete_after=60)
 
@@ -183,11 +250,12 @@ async def vouch(ctx: Context, discord_id: str, steam_id: str):
     discord_id = discord_id.replace('\\', '').replace('<', '').replace('>', '').replace(
         '@', '').replace('!', '').replace('#', '').replace('&', '')  # <@337347092139737099>
     try:
-        execute_function_single_row_return('get_player_id', discord_id)
+        await get_player_id.run_async(discord_id)
         await ctx.reply('Player <@{0}> has already been vouched for'.format(discord_id), delete_after=10)
     except ValueError:
-        execute_function_no_return(
-            'add_player', discord_id, steam_id, STARTING_MMR)
+        player_id = await add_player.run_async(discord_id, steam_id, STARTING_MMR)
+        if discord_id.isdigit():
+            bot.player_ids.add(int(discord_id), player_id)  # type: ignore
         await ctx.reply('<@{0}> has been vouched'.format(discord_id))
 
 
@@ -201,38 +269,16 @@ async def score(ctx: Context, game_id: str, score: str, steam_match_id: str):
     else:
         result = 0 if score == 'radiant' else 1
         try:
-            game = execute_function_single_row_return('get_game', game_id)
+            changes = await score_game_result.run_async(game_id, result, steam_match_id)
         except ValueError:
             await ctx.reply('Game with id {} does not exist'.format(game_id), delete_after=10)
             return
-        if game['status'] == 'OVER':
+        except GameAlreadyScored:
             await ctx.reply('Game already scored', delete_after=10)
             return
-        
-        execute_function_no_return(
-            'score_game', game_id, result, steam_match_id)
-        
-        players = execute_function_with_return(
-            'get_all_players_from_game', game_id)
-
-        team_one = [player['mmr'] for player in players if player['team'] == 0]
-        team_two = [player['mmr'] for player in players if player['team'] == 1]
-        team_one_avg_mmr = round(
-            sum(team_one)/len(team_one)) if len(team_one) > 0 else 0
-        team_two_avg_mmr = round(
-            sum(team_two)/len(team_two)) if len(team_two) > 0 else 0
-        if len(team_one) > 0 and len(team_two) > 0:
-            elo_change = calculate_elo(
-                team_one_avg_mmr, team_two_avg_mmr, 1 if result == 0 else -1)
-        else:
-            elo_change = 25  # only applys to testing when the queue size is one
-        for player in players:
-            if player['team'] == result:  # if players has the same team as the one that won
-                execute_function_no_return('update_player_mmr_won', player['id'], elo_change)
-            else:
-                execute_function_no_return('update_player_mmr_lost', player['id'], elo_change)
+        elo_change = max((change['delta'] for change in changes), default=0)
 
-        await ctx.reply('Game scored, {} won game {}'.format(score, game_id))
+        await ctx.reply('Game scored, {} won game {} (+/-{} mmr)'.format(score, game_id, elo_change))
         RENDER['leaderboard'] = True
 
 
@@ -241,22 +287,18 @@ async def score(ctx: Context, game_id: str, score: str, steam_match_id: str):
 async def rehost(ctx: Context, game_id: str):
     global RENDER
     try:
-        execute_function_single_row_return('get_game', game_id)
+        await get_game.run_async(game_id)
     except ValueError:
         await ctx.reply('Game with id {} does not exist'.format(game_id), delete_after=10)
         return
-    players = execute_function_with_return('get_all_players_from_game', game_id)
+    players = await get_all_players_from_game.run_async(game_id)
     for player in players:
-        if player['discord_id'] in [player.id for player in bot.sigedUpPlayerPool]:
-            player_to_remove = next(member for member in bot.sigedUpPlayerPool if member.id == player['discord_id'] )
-            bot.sigedUpPlayerPool.remove(player_to_remove)
+        if bot.sigedUpPlayerPool.leave(player.discord_id):
             RENDER['queue'] = True
-        if player['discord_id'] in [player.id for player in bot.sigedUpDraftPlayerPool]:
-            player_to_remove = next(member for member in bot.sigedUpDraftPlayerPool if member.id == player['discord_id'])
-            bot.sigedUpDraftPlayerPool.remove(player_to_remove)
+        if bot.sigedUpDraftPlayerPool.leave(player.discord_id):
             RENDER['queue_draft'] = True
-    execute_function_no_return('reset_all_players_arrived', game_id)
-    execute_function_no_return('set_game_status_rehost', game_id)
+    await reset_all_players_arrived.run_async(game_id)
+    await set_game_status_rehost.run_async(game_id)
     await ctx.reply('Game rehosted')
 
 
@@ -264,7 +306,7 @@ async def rehost(ctx: Context, game_id: str):
 @bot.hybrid_command("clearqueue", description="Clear the queue")
 async def clear_queue(ctx: Context):
     global RENDER
-    bot.sigedUpPlayerPool = []
+    bot.sigedUpPlayerPool.clear()
     await ctx.reply('Queue cleared by <@{0}>'.format(ctx.message.author.id))
     RENDER['queue'] = True
 
@@ -273,7 +315,7 @@ async def clear_queue(ctx: Context):
 @bot.hybrid_command("cleardraftqueue", description="Clear the queue")
 async def clear_queue(ctx: Context):
     global RENDER
-    bot.sigedUpDraftPlayerPool = []
+    bot.sigedUpDraftPlayerPool.clear()
     await ctx.reply('Queue cleared by <@{0}>'.format(ctx.message.author.id))
     RENDER['queue_draft'] = True
 
@@ -282,25 +324,23 @@ async def clear_queue(ctx: Context):
 @bot.hybrid_command("cancelgame", description="Cancel a game")
 async def cancel_game(ctx: Context, game_id: str):
     global RENDER
-    game = execute_function_single_row_return('get_game', game_id)
-    if game['status'] in ['OVER', 'ABORTED']:
+    game = await get_game.run_async(game_id)
+    if game.status in ['OVER', 'ABORTED']:
         await ctx.reply('Game already scored or aborted', delete_after=10)
         return
     try:
-        players = execute_function_with_return('get_players_arrived', game_id)
-        if game['type'] == 'DRAFT':
-            returning_players = [Player(player['id']) for player in players if player['id'] not in [player.id for player in bot.sigedUpDraftPlayerPool]]
-            bot.sigedUpDraftPlayerPool = returning_players + bot.sigedUpDraftPlayerPool
+        players = await get_players_arrived.run_async(game_id)
+        if game.type == 'DRAFT':
+            bot.sigedUpDraftPlayerPool.return_to_front(Player(player['id']) for player in players)
             RENDER['queue_draft'] = True
             await _check_pool_size_and_start_draft(ctx)
         else:
-            returning_players = [Player(player['id']) for player in players if player['id'] not in [player.id for player in bot.sigedUpPlayerPool]]
-            bot.sigedUpPlayerPool = returning_players + bot.sigedUpPlayerPool
+            bot.sigedUpPlayerPool.return_to_front(Player(player['id']) for player in players)
             RENDER['queue'] = True
             await _check_pool_size_and_start(ctx)
     except ValueError:
         pass
-    execute_function_no_return('set_game_status_cancel', game_id)
+    await set_game_status_cancel.run_async(game_id)
     await ctx.reply('Game canceled')
 
 @commands.has_role(ADMIN_ROLE)
@@ -309,14 +349,59 @@ async def cancel_game(ctx: Context, discord_id: str):
     discord_id = discord_id.replace('\\', '').replace('<', '').replace('>', '').replace(
         '@', '').replace('!', '').replace('#', '').replace('&', '')  # <@337347092139737099>
     try:
-        player_id = execute_function_single_row_return('get_player_id', discord_id)['id']
+        player_id = (await get_player_id.run_async(discord_id))['id']
     except ValueError:
         await ctx.reply('Player needs to be vouched before becoming a captain.', mention_author=True, delete_after=10)
-    execute_function_no_return('set_player_captain', player_id)
+    await set_player_captain.run_async(player_id)
     await ctx.reply('Player <@{}> marked as captain'.format(discord_id))
     
 
 
+@commands.has_role(ADMIN_ROLE)
+@bot.hybrid_command("dbstats", description="Show database lock contention")
+async def db_stats(ctx: Context):
+    contention = db.get_contention_stats()
+    if len(contention) == 0:
+        await ctx.reply('No lock contention recorded', delete_after=30)
+        return
+    embed = Embed(title="Database contention", description="Since bot start", color=0xeee657)
+    contended = sorted(contention.items(), key=lambda item: -item[1]['wait_time'])
+    for function_name, stats in contended[:EMBED_MAX_FIELDS]:
+        embed.add_field(name=function_name,
+                        value=f"retries: {stats['retries']}\nwaited: {stats['wait_time']:.2f}s\nfailed: {stats['failures']}", inline=True)
+    rest = [stats for _, stats in contended[EMBED_MAX_FIELDS:]]
+    if rest:
+        embed.set_footer(text=f"{len(rest)} more queries, retries: {sum(stats['retries'] for stats in rest)}, "
+                              f"waited: {sum(stats['wait_time'] for stats in rest):.2f}s, "
+                              f"failed: {sum(stats['failures'] for stats in rest)}")
+    await ctx.reply(embed=embed, delete_after=60)
+
+
+@commands.has_role(ADMIN_ROLE)
+@bot.hybrid_command("rebuildstats", description="Rebuild player stats from the game history")
+async def rebuild_stats(ctx: Context):
+    await rebuild_player_stats.run_async()
+    await ctx.reply('Player stats rebuilt', delete_after=30)
+
+
+@commands.has_role(ADMIN_ROLE)
+@bot.hybrid_command("backup", description="Take a snapshot of the league database")
+async def backup(ctx: Context):
+    try:
+        path = await db.run_blocking(db.backup_database)
+    except (ValueError, sqlite3.Error) as e:
+        await ctx.reply(f'Backup failed: {e}', delete_after=60)
+        return
+    await ctx.reply(f'Backup saved to {path}', delete_after=60)
+
+
+@commands.has_role(ADMIN_ROLE)
+@bot.hybrid_command("archive", description="Archive old aborted and canceled games")
+async def archive(ctx: Context, days: int = ARCHIVE_AFTER_DAYS):
+    archived = await db.run_blocking(archive_games, days)
+    await ctx.reply(f'Archived {archived} games older than {days} days', delete_after=60)
+
+
 @bot.hybrid_command("autoscore", description="Attempt to score a game")
 async def autoscore(ctx: Context):
     global AUTO_SCORING_IN_PROGRESS 
@@ -328,7 +413,7 @@ async def autoscore(ctx: Context):
         await ctx.reply('No matches found in a league with id {0}'.format(LEAGUE_ID), delete_after=10)
         return
     try:
-        active_games = execute_function_with_return('get_active_games')
+        active_games = await get_active_games.run_async()
     except ValueError:
         await ctx.reply('No games in progress', delete_after=10)
         return
@@ -340,13 +425,11 @@ async def autoscore(ctx: Context):
     AUTO_SCORING_IN_PROGRESS  = True
     active_game_players_dict = {}
     for game_players in active_games:
-        players_in_active_game = execute_function_with_return(
-            'get_all_players_from_game', game_players['id'])
-        active_game_players_dict[game_players['id']] = [
-            (player['steam_id'], player['team']) for player in players_in_active_game]
+        players_in_active_game = await get_all_players_from_game.run_async(game_players.id)
+        active_game_players_dict[game_players.id] = [
+            (player.steam_id, player.team) for player in players_in_active_game]
     try:
-        scored_games = execute_function_with_return(
-            'get_scored_games_with_steam_match_id')
+        scored_games = await get_scored_games_with_steam_match_id.run_async()
     except ValueError:
         scored_games = []
         pass
@@ -402,13 +485,10 @@ async def autoscore(ctx: Context):
 async def signup(ctx: Context):
     global RENDER
     author: Member = ctx.message.author  # type: ignore
-    try:
-        execute_function_single_row_return('get_player_id', author.id)
-    except ValueError:
+    if await bot.player_ids.lookup(author.id) is None:  # type: ignore
         await ctx.reply('You need to signup for the leage', mention_author=True, delete_after=10)
         return
-    if author not in bot.sigedUpPlayerPool:  # type: ignore
-        bot.sigedUpPlayerPool.append(author)  # type: ignore
+    if bot.sigedUpPlayerPool.join(author):  # type: ignore
         await ctx.reply('You successfully signed up for a game', mention_author=True, delete_after=10)
         RENDER['queue'] = True
         await _check_pool_size_and_start(ctx)
@@ -420,13 +500,10 @@ async def signup(ctx: Context):
 async def signup(ctx: Context):
     global RENDER
     author: Member = ctx.message.author  # type: ignore
-    try:
-        execute_function_single_row_return('get_player_id', author.id)
-    except ValueError:
+    if await bot.player_ids.lookup(author.id) is None:  # type: ignore
         await ctx.reply('You need to signup for the leage', mention_author=True, delete_after=10)
         return
-    if author not in bot.sigedUpDraftPlayerPool:  # type: ignore
-        bot.sigedUpDraftPlayerPool.append(author)  # type: ignore
+    if bot.sigedUpDraftPlayerPool.join(author):  # type: ignore
         await ctx.reply('You successfully signed up for a game', mention_author=True, delete_after=10)
         RENDER['queue_draft'] = True
         await _check_pool_size_and_start_draft(ctx)
@@ -437,31 +514,30 @@ async def signup(ctx: Context):
 @bot.hybrid_command("stats", description="Show my stats")
 async def stats(ctx: Context):
     author: Member = ctx.message.author  # type: ignore
+    if await bot.player_ids.lookup(author.id) is None:  # type: ignore
+        await ctx.reply('You need to signup for the leage', mention_author=True, delete_after=10)
+        return
     try:
-        player_id = execute_function_single_row_return(
-            'get_player_id', author.id)['id']
+        player = await get_player.run_async(author.id)
     except ValueError:
         await ctx.reply('You need to signup for the leage', mention_author=True, delete_after=10)
         return
-    games_played = execute_function_single_row_return(
-        'get_if_player_played_game', player_id)['played']
-    if games_played == 0:
+    try:
+        player_stats = await get_player_stats.run_async(player.id)
+    except ValueError:
         await ctx.reply('You have not played any games', mention_author=True, delete_after=10)
         return
 
-    player_rank = execute_function_single_row_return(
-        'get_player_rank', player_id)
-    wins_and_losses = execute_function_single_row_return(
-        'get_players_wins_and_losses', player_id)
+    player_rank = await db.run_blocking(leaderboard.rank, player.id)
 
     embed = Embed(title="Stats", description="Your stats", color=0xeee657)
     embed.add_field(
-        name=f"Player", value=f'''<@{player_rank['discord_id']}>''', inline=True)
-    embed.add_field(name=f"Rank", value=player_rank['rank'], inline=True)
-    embed.add_field(name=f"MMR", value=player_rank['mmr'], inline=True)
-    embed.add_field(name=f"Wins", value=wins_and_losses['wins'], inline=True)
+        name=f"Player", value=f'''<@{player.discord_id}>''', inline=True)
+    embed.add_field(name=f"Rank", value=player_rank, inline=True)
+    embed.add_field(name=f"MMR", value=player.mmr, inline=True)
+    embed.add_field(name=f"Wins", value=player_stats['wins'], inline=True)
     embed.add_field(
-        name=f"Losses", value=wins_and_losses['losses'], inline=True)
+        name=f"Losses", value=player_stats['losses'], inline=True)
     await ctx.reply(embed=embed, delete_after=20)
 
 
@@ -469,15 +545,11 @@ async def stats(ctx: Context):
 async def leave(ctx: Context):
     global RENDER
     author: Member = ctx.message.author  # type: ignore
-    player_to_remove_from_queue = next((member for member in bot.sigedUpPlayerPool if member.id == author.id ), None)
-    player_to_remove_from_draft_queue = next((member for member in bot.sigedUpDraftPlayerPool if member.id == author.id ), None)
-    if  player_to_remove_from_queue is None and  player_to_remove_from_draft_queue is None:  # type: ignore
+    left_queue = bot.sigedUpPlayerPool.leave(author.id)  # type: ignore
+    left_draft_queue = bot.sigedUpDraftPlayerPool.leave(author.id)  # type: ignore
+    if left_queue is None and left_draft_queue is None:
         await ctx.reply('You are not in the queue', mention_author=True, delete_after=10)
         return
-    if player_to_remove_from_queue:
-        bot.sigedUpPlayerPool.remove(player_to_remove_from_queue)
-    if player_to_remove_from_draft_queue:
-        bot.sigedUpDraftPlayerPool.remove(player_to_remove_from_draft_queue)
     await ctx.reply('You left the queue', mention_author=True, delete_after=10)
     RENDER['queue'] = True
     RENDER['queue_draft'] = True
@@ -486,13 +558,12 @@ async def leave(ctx: Context):
 @bot.hybrid_command("preferredrole", description="Set your prefred role")
 async def prefred_role(ctx: Context, roles: int):
     author: Member = ctx.message.author  # type: ignore
-    try:
-        player_id = execute_function_single_row_return('get_player_id', author.id)['id']
-    except ValueError:
+    player_id = await bot.player_ids.lookup(author.id)  # type: ignore
+    if player_id is None:
         await ctx.reply('You need to signup for the leage', mention_author=True, delete_after=10)
         return
     try:
-        execute_function_no_return('delete_player_roles', player_id)
+        await delete_player_roles.run_async(player_id)
     except DataBaseErrorNonModified:
         pass
     if roles == 0:
@@ -505,45 +576,36 @@ async def prefred_role(ctx: Context, roles: int):
         return
 
     for role in roles:
-        execute_function_no_return('set_player_role', player_id, role)
+        await set_player_role.run_async(player_id, role)
     await ctx.reply('Your prefred roles have been set', mention_author=True, delete_after=10)
 
-async def _create_game(ctx: Context, platers_for_lobby: List[Member]):
+async def _create_game(ctx: Context, players_for_lobby: List[Any]):
     global RENDER
 
-    players_for_lobby, lobby_name, lobby_password = await _get_game_args(platers_for_lobby)
+    players_for_lobby, lobby_name, lobby_password = await _get_game_args(players_for_lobby)
 
     await _send_game_embed(ctx, players_for_lobby, lobby_name)
     await _send_game_name_and_password(players_for_lobby, lobby_name, lobby_password)
 
 
-async def _get_game_args(players: List[Member]):
-    players_for_lobby = _get_players_from_db(players)
-    balanced_shuffle(players_for_lobby) #will add team(0 or 1) to players in players_for_lobby
+async def _get_game_args(players_for_lobby: List[Any]):
+    if BALANCE_ROLES:
+        await _add_roles_to_players(players_for_lobby)
+    balanced_shuffle(players_for_lobby, BALANCE_ROLES) #will add team(0 or 1) to players in players_for_lobby
 
-    game_id = execute_insert_and_return_id('add_game', 'NORMAL')
-    lobby_name = GAME_NAME + str(game_id)
     lobby_password = get_random_password()
+    game_id, lobby_name = await create_game_with_players.run_async(
+        'NORMAL', GAME_NAME, lobby_password, players_for_lobby)
 
-    execute_function_no_return('add_game_args', game_id, lobby_name, lobby_password)
-    for player in players_for_lobby:
-        execute_function_no_return('add_player_to_game', game_id, player['id'], player['team'])
-        
     _log(f'Creating game #{game_id}')
     return players_for_lobby, lobby_name, lobby_password
 
 
 async def _create_a_draft_game(ctx, players_for_lobby: List[Any]):
-    game_id = execute_insert_and_return_id('add_game', 'DRAFT')
-    _log(f'Creating game #{game_id}')
-    lobby_name = GAME_NAME + str(game_id)
     lobby_password = get_random_password()
-
-    execute_function_no_return(
-       'add_game_args', game_id, lobby_name, lobby_password)
-    for player in players_for_lobby:
-       execute_function_no_return(
-           'add_player_to_game', game_id, player['id'], player['team'])
+    game_id, lobby_name = await create_game_with_players.run_async(
+        'DRAFT', GAME_NAME, lobby_password, players_for_lobby)
+    _log(f'Creating game #{game_id}')
 
     await _send_game_embed(ctx, players_for_lobby, lobby_name)
     await _send_game_name_and_password(players_for_lobby, lobby_name, lobby_password)
@@ -552,8 +614,8 @@ async def _create_a_draft_game(ctx, players_for_lobby: List[Any]):
 async def _send_game_name_and_password(players, lobbyname, lobby_password):
     await bot.admin_channel.send(f"Game hosted.\nLobby name: {lobbyname}\nPassword: {lobby_password}")
     for player in players:
-        discord_user = await bot.fetch_user(player['discord_id'])
-        await discord_user.send(f"Game name: {lobbyname}\nPassword: {lobby_password}\nYou are playing as: {'**Radiant**' if player['team'] == 0 else '**Dire**'}")
+        discord_user = await bot.fetch_user(player.discord_id)
+        await discord_user.send(f"Game name: {lobbyname}\nPassword: {lobby_password}\nYou are playing as: {'**Radiant**' if player.team == 0 else '**Dire**'}")
 
 
 async def _create_game_embed(players, lobyname) -> Embed:
@@ -569,28 +631,39 @@ async def _create_game_embed(players, lobyname) -> Embed:
     return embed
 
 
-def _get_players_from_db(players: List[Member]) -> List[Any]:
-    loby_players = []
-    for p in players:
-        player = execute_function_single_row_return(
-            'get_player', p.id)  # player.id in this case is discord_id
-        loby_players.append(player)
+async def _get_players_from_db(players: List[Member]) -> List[Any]:
+    # player.id in this case is discord_id
+    loby_players = await get_players_by_ids.run_async(json.dumps([p.id for p in players]))
+    if len(loby_players) != len(players):
+        raise ValueError('Not every queued player is vouched')
     return loby_players
 
 
+async def _add_roles_to_players(players: List[Any]) -> None:
+    try:
+        rows = await get_roles_of_players.run_async(json.dumps([player.id for player in players]))
+    except ValueError:
+        rows = []  # nobody has set roles
+    roles = {player.id: [] for player in players}
+    for player_id, role in rows:
+        roles[player_id].append(role)
+    for player in players:
+        player.roles = roles[player.id]
+
+
 def _players_list(players):
     players_str = ''
     for player in players:
         players_str += '<@' + \
-            str(player['discord_id']) + '> ' + str(player['mmr']) + '\n'
+            str(player.discord_id) + '> ' + str(player.mmr) + '\n'
     return players_str
 
 
 def _calculate_team_stats(players, team_id):
-    team_players = [player for player in players if player['team'] == team_id]
+    team_players = [player for player in players if player.team == team_id]
     team_str = _players_list(team_players)
     team_size = len(team_players)
-    avg_mmr = sum([player['mmr'] for player in team_players]) / \
+    avg_mmr = sum([player.mmr for player in team_players]) / \
         team_size if team_size > 0 else 0
     return team_str, avg_mmr
 
@@ -605,10 +678,9 @@ async def _send_game_embed(ctx, players_for_lobby, lobby_name):
 
 
 async def _create_leaderboard_embed():
-    try:
-        standings = execute_function_with_return('get_leaderboards')
-    except ValueError:
-        standings = execute_function_with_return('get_all_players') #new season no players to load
+    standings = await db.run_blocking(leaderboard.standings)
+    if len(standings) == 0:
+        standings = await get_all_players.run_async() #new season no players to load
     embed = Embed(title="Standings",
                   description="", color=0xeee657)
 
@@ -625,8 +697,8 @@ async def _create_leaderboard_embed():
         mmr_str = ""
         separator = 0 #every 10 players add a separator, a new line in the field
         for player in chunk:
-            player_str += f'{rank+1} <@' + str(player['discord_id']) + '>' + '\n'
-            mmr_str += str(player['mmr']) + '\n'
+            player_str += f'{rank+1} <@' + str(player.discord_id) + '>' + '\n'
+            mmr_str += str(player.mmr) + '\n'
             rank += 1
             separator += 1
             if separator == 10:
@@ -638,35 +710,71 @@ async def _create_leaderboard_embed():
 
     return embed
 
-async def _check_pool_size_and_start(ctx: Context):
-    global RENDER
-    if len(bot.sigedUpPlayerPool) >= LOBBY_SIZE:  # type: ignore
-        for player in bot.sigedUpPlayerPool[:LOBBY_SIZE]:
-            if player in bot.sigedUpDraftPlayerPool:
-                bot.sigedUpDraftPlayerPool.remove(player)
+async def _check_pool_size_and_start(ctx: Context = None):
+    global MATCHMAKING_TASK
+    if len(bot.sigedUpPlayerPool) < LOBBY_SIZE or MATCHMAKING_TASK is not None:  # type: ignore
+        return
+    if MATCHMAKING_WINDOW > 0 and len(bot.sigedUpPlayerPool) != LOBBY_SIZE:  # type: ignore
+        # let a burst of signups gather and match it as one batch, the signup replies don't wait for it.
+        # a queue of exactly one lobby starts right away
+        MATCHMAKING_TASK = asyncio.create_task(_start_games_after_window(ctx))
+        MATCHMAKING_TASK.add_done_callback(_log_matchmaking_failure)
+    else:
+        await _start_games(ctx)
 
-        platers_for_lobby = bot.sigedUpPlayerPool[:LOBBY_SIZE]
-        bot.sigedUpPlayerPool = bot.sigedUpPlayerPool[LOBBY_SIZE:]
 
-        RENDER['queue'] = True
-        RENDER['queue_draft'] = True
+async def _start_games_after_window(ctx: Context):
+    global MATCHMAKING_TASK
+    try:
+        await asyncio.sleep(MATCHMAKING_WINDOW)
+        await _start_games(ctx)
+    finally:
+        MATCHMAKING_TASK = None
+
+
+def _log_matchmaking_failure(task: asyncio.Task):
+    # nothing awaits the window task, its errors would be lost
+    if not task.cancelled() and task.exception() is not None:
+        _log(f'Matchmaking failed: {task.exception()!r}', 'ERROR   ')
 
-        await _create_game(ctx, platers_for_lobby)
+
+async def _start_games(ctx: Context):
+    global RENDER
+    matched = len(bot.sigedUpPlayerPool) // LOBBY_SIZE * LOBBY_SIZE  # type: ignore
+    if matched == 0:
+        return  # players left during the window
+    players_for_lobbies = bot.sigedUpPlayerPool.pop(matched)  # type: ignore
+
+    RENDER['queue'] = True
+    RENDER['queue_draft'] = True
+
+    try:
+        players = await _get_players_from_db(players_for_lobbies)
+    except (ValueError, sqlite3.Error):
+        # no game was created, the players keep their place in the queue
+        bot.sigedUpPlayerPool.return_to_front(players_for_lobbies)  # type: ignore
+        raise
+    lobbies = partition_lobbies([player.mmr for player in players], LOBBY_SIZE)
+    await asyncio.gather(*(_create_game(ctx, [players[index] for index in lobby]) for lobby in lobbies))
 
 async def _check_pool_size_and_start_draft(ctx: Context = None):
     global RENDER
     if len(bot.sigedUpDraftPlayerPool) >= LOBBY_SIZE:  # type: ignore
-        draft_view = DraftView(bot,ctx, bot.sigedUpDraftPlayerPool[:LOBBY_SIZE], _create_a_draft_game)
-        draft_view_content = draft_view.create_view_embed()
-
-        for player in bot.sigedUpDraftPlayerPool[:LOBBY_SIZE]:
-            if player in bot.sigedUpPlayerPool:
-                bot.sigedUpPlayerPool.remove(player)
-        bot.sigedUpDraftPlayerPool = bot.sigedUpDraftPlayerPool[LOBBY_SIZE:]
+        # take the players out of the queue before awaiting so a concurrent signup can't draft them twice
+        players_for_draft = bot.sigedUpDraftPlayerPool.pop(LOBBY_SIZE)  # type: ignore
 
         RENDER['queue'] = True
         RENDER['queue_draft'] = True
 
+        try:
+            draft_players = await db.run_blocking(get_players_from_db, bot, players_for_draft)
+        except (ValueError, sqlite3.Error):
+            # no draft was started, the players keep their place in the queue
+            bot.sigedUpDraftPlayerPool.return_to_front(players_for_draft)  # type: ignore
+            raise
+        draft_view = DraftView(bot,ctx, draft_players, _create_a_draft_game)
+        draft_view_content = draft_view.create_view_embed()
+
         await bot.draft_channel.send(embed=draft_view_content, view=draft_view)
         if ctx:
             await ctx.reply(f'''Game created, chekout <#{bot.draft_channel.id}>''', delete_after=10)  # type: ignore
@@ -730,6 +838,12 @@ async def _update_console():
 
 async def _rerender_queue_console_if_needed(on_start=False):
     messages = [message async for message in bot.console_channel.history(oldest_first=True)]
+    if len(messages) == 3 and on_start and all(message.author == bot.user for message in messages):
+        # a restart keeps the console, the restored queues are rendered into it and the buttons reattached
+        await messages[0].edit(embed=_create_draft_queue_embed())
+        await messages[1].edit(embed=_create_queue_embed())
+        await messages[2].edit(embed=await _update_console(), view=ConsoleView(bot, RENDER, _check_pool_size_and_start, _check_pool_size_and_start_draft))
+        return messages
     if len(messages) < 3 or on_start:
         for message in messages:
             await message.delete()
@@ -753,4 +867,10 @@ async def _rerender_leaderboard_if_needed(on_start=False):
     return messages
 
 
-bot.run(TOKEN)
+db.ensure_database_exists()
+_log(f'Restored {QUEUE_JOURNAL.restore()} queued players')
+_log(f'Loaded {bot.player_ids.load()} vouched players')  # type: ignore
+try:
+    bot.run(TOKEN)
+finally:
+    QUEUE_JOURNAL.flush()
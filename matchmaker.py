@@ -0,0 +1,54 @@
+"""
+Matchmaking that runs without discord, the batch partition of the queue and draft captains.
+
+Batch matchmaking is for when the queue holds several lobbies worth of players, after an announcement
+or when a timed out game returns its players. The players are split into lobbies together instead
+of one lobby per LOBBY_SIZE signups in queue order.
+Only the longest waiting players are matched, whoever joined last waits for the next lobby.
+Among those, lobbies of consecutive mmr have the smallest worst spread: for the j-th block of the
+sorted mmrs, more than j - 1 lobbies hold a player at or below its lowest and more than k - j hold
+one at or above its highest, so some lobby holds both.
+"""
+from random import choice
+from typing import Any, List, Sequence, Tuple
+
+
+def partition_lobbies(mmrs: Sequence[int], lobby_size: int) -> List[List[int]]:
+    """
+    mmrs in queue order, oldest first. Returns the queue indexes of each full lobby, in queue order,
+    lobbies ordered by their longest waiting player. Indexes past the last full lobby are not matched.
+    """
+    if lobby_size <= 0:
+        raise ValueError('lobby_size must be positive')
+    matched = len(mmrs) // lobby_size * lobby_size
+    by_mmr = sorted(range(matched), key=lambda index: (mmrs[index], index))
+    lobbies = [sorted(by_mmr[start:start + lobby_size]) for start in range(0, matched, lobby_size)]
+    return sorted(lobbies, key=lambda lobby: lobby[0])
+
+
+def spread(mmrs: Sequence[int], lobby: Sequence[int]) -> int:
+    values = [mmrs[index] for index in lobby]
+    return max(values) - min(values)
+
+
+def worst_spread(mmrs: Sequence[int], lobbies: Sequence[Sequence[int]]) -> int:
+    return max((spread(mmrs, lobby) for lobby in lobbies), default=0)
+
+
+def select_captains(players: List[Any]) -> Tuple[List[Any], List[Any], Any]:
+    """
+    The two highest mmr captains, topped up with the highest mmr players when fewer than two
+    players are captains. Returns the captains, the players left to draft and the first drafter.
+    """
+    potential_captains = [player for player in players if player.captain == 1]
+    if len(potential_captains) >= 2:
+        captains = sorted(potential_captains, key=lambda x: x.mmr)[-2:]
+        rest = [player for player in players if player is not captains[0] and player is not captains[1]]
+        return captains, rest, choice(captains)
+    if len(potential_captains) == 1:
+        rest = [player for player in players if player is not potential_captains[0]]
+        max_mmr_player = max(rest, key=lambda x: x.mmr)
+        rest.remove(max_mmr_player)
+        return [potential_captains[0], max_mmr_player], rest, max_mmr_player
+    sorted_players = sorted(players, key=lambda x: x.mmr)
+    return sorted_players[-2:], sorted_players[:-2], choice(sorted_players[-2:])
@@ -3,8 +3,6 @@ from random import choice
 from discord import ButtonStyle, Interaction, TextChannel
 from discord.ui import View, Button
 
-from discord_db import execute_function_single_row_return
-
 class ConsoleView(View):
     def __init__(self, bot, RENDER, callback_normal, callback_draft):
         super().__init__(timeout=None)
@@ -25,13 +23,10 @@ class ConsoleView(View):
 
     async def signup_callback(self, interaction : Interaction):
         user = interaction.user
-        try:
-            execute_function_single_row_return('get_player_id', interaction.user.id)
-        except ValueError:
+        if await self.bot.player_ids.lookup(user.id) is None:  # type: ignore
             await self.console_channel.send(f'<@{user.id}> You need to signup for the leage', delete_after=5)
             return
-        if user not in self.bot.sigedUpPlayerPool:  # type: ignore
-            self.bot.sigedUpPlayerPool.append(user)  # type: ignore
+        if self.bot.sigedUpPlayerPool.join(user):  # type: ignore
             await  self.console_channel.send(f'<@{user.id}>You successfully signed up for a game', delete_after=5)
             self.RENDER['queue'] = True
             await self.callback_normal(None)
@@ -41,13 +36,10 @@ class ConsoleView(View):
         
     async def signup_draft_callback(self, interaction : Interaction):
         user = interaction.user
-        try:
-            execute_function_single_row_return('get_player_id', interaction.user.id)
-        except ValueError:
+        if await self.bot.player_ids.lookup(user.id) is None:  # type: ignore
             await self.console_channel.send(f'<@{user.id}>You need to signup for the leage', delete_after=5)
             return
-        if user not in self.bot.sigedUpDraftPlayerPool:  # type: ignore
-            self.bot.sigedUpDraftPlayerPool.append(user)  # type: ignore
+        if self.bot.sigedUpDraftPlayerPool.join(user):  # type: ignore
             await self.console_channel.send(f'<@{user.id}>You successfully signed up for a draft game', delete_after=5)
             self.RENDER['queue_draft'] = True
             await self.callback_draft(None)
@@ -57,15 +49,11 @@ class ConsoleView(View):
 
     async def leave_callback(self, interaction : Interaction):
         user = interaction.user  # type: ignore
-        player_to_remove_from_queue = next((member for member in self.bot.sigedUpPlayerPool if member.id == interaction.user.id ), None)
-        player_to_remove_from_draft_queue = next((member for member in self.bot.sigedUpDraftPlayerPool if member.id == interaction.user.id ), None)
-        if  player_to_remove_from_queue is None and  player_to_remove_from_draft_queue is None:  # type: ignore
+        left_queue = self.bot.sigedUpPlayerPool.leave(user.id)  # type: ignore
+        left_draft_queue = self.bot.sigedUpDraftPlayerPool.leave(user.id)  # type: ignore
+        if left_queue is None and left_draft_queue is None:
             await self.console_channel.send(f'<@{user.id}>You are not in the queue',delete_after=5)
             return
-        if player_to_remove_from_queue:
-            self.bot.sigedUpPlayerPool.remove(player_to_remove_from_queue)
-        if player_to_remove_from_draft_queue:
-            self.bot.sigedUpDraftPlayerPool.remove(player_to_remove_from_draft_queue)
         await self.console_channel.send(f'<@{user.id}>You left the queue', delete_after=5)
         self.RENDER['queue'] = True
         self.RENDER['queue_draft'] = True
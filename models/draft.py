@@ -5,14 +5,16 @@ from discord import ButtonStyle, Interaction, Member, Embed, TextChannel
 from discord.ui import View, Button
 from discord.ext.commands import Context, Bot
 
-from discord_db import execute_function_single_row_return, execute_function_with_return
+from queries import get_player, get_player_role, get_player_stats
+from leaderboard import leaderboard
+from matchmaker import select_captains
 
 RADIANT = 0
 DIRE = 1
 MAX_USERNAME_LENGTH = 15
 
 class DraftView(View):
-    def __init__(self, bot : Bot, replay_ctx : Context , players : List[Member], callback):
+    def __init__(self, bot : Bot, replay_ctx : Context , players : List[Any], callback):
         super().__init__(timeout=None)
         self.bot = bot
         self.txt_channel: TextChannel = bot.draft_channel
@@ -23,8 +25,6 @@ class DraftView(View):
         self.giving_up_draft = False
         self.pick_phase = 0
 
-        self._get_players_from_db()
-        
 
         self.drafters = self._select_captains()
         
@@ -41,8 +41,8 @@ class DraftView(View):
     async def button_callback(self, interaction : Interaction):
 
         drafter = interaction.user.id
-        if drafter != self.current_drafter['discord_id']:
-            await self.txt_channel.send(f"Its <@{self.current_drafter['discord_id']}> turn to pick", delete_after=3)
+        if drafter != self.current_drafter.discord_id:
+            await self.txt_channel.send(f"Its <@{self.current_drafter.discord_id}> turn to pick", delete_after=3)
             return
         
         if interaction.data['custom_id'] == 'end_draft':
@@ -62,7 +62,7 @@ class DraftView(View):
         if self.giving_up_draft:
             self.giving_up_draft = False
             index_original_drafter = self.drafters.index(self.current_drafter)
-            self.current_drafter = list(filter(lambda player: str(player['id']) == interaction.data['custom_id'], self.teams[drafter_team]))[0]
+            self.current_drafter = list(filter(lambda player: str(player.id) == interaction.data['custom_id'], self.teams[drafter_team]))[0]
             self.drafters[index_original_drafter] = self.current_drafter
             self.clear_items()
             self._set_buttons()
@@ -70,11 +70,11 @@ class DraftView(View):
             return
 
 
-        drafted_player  = list(filter(lambda player: str(player['id']) == interaction.data['custom_id'], self.players))[0]
+        drafted_player  = list(filter(lambda player: str(player.id) == interaction.data['custom_id'], self.players))[0]
         self.players.remove(drafted_player)
 
-        self.buttons[str(drafted_player['id'])].disabled = True
-        self.buttons[str(drafted_player['id'])].style = ButtonStyle.secondary
+        self.buttons[str(drafted_player.id)].disabled = True
+        self.buttons[str(drafted_player.id)].style = ButtonStyle.secondary
 
         self.teams[drafter_team].append(drafted_player)
 
@@ -92,52 +92,30 @@ class DraftView(View):
         await interaction.response.edit_message(embed=self.create_view_embed(), view=self)
 
     def _get_drafters_team(self, drafter):
-        return RADIANT if drafter['discord_id'] == self.teams[RADIANT][0]['discord_id'] else DIRE
+        return RADIANT if drafter.discord_id == self.teams[RADIANT][0].discord_id else DIRE
     
     def _select_captains(self):
-        potential_captains = []
-
-        for player in self.players:
-            if player['captain'] == 1:
-                potential_captains.append(player)
-    
-        if(len(potential_captains) >= 2):
-            potential_captains = sorted(potential_captains, key=lambda x: x['mmr'])
-            self.players.remove(potential_captains[-1])
-            self.players.remove(potential_captains[-2])
-            self.current_drafter = choice(potential_captains[-2:])
-            return potential_captains[-2:]
-        elif(len(potential_captains) == 1):
-            self.players.remove(potential_captains[0])
-            max_mmr_player = max(self.players, key=lambda x: x['mmr'])
-            potential_captains.append(max_mmr_player)
-            self.players.remove(max_mmr_player)
-            self.current_drafter = potential_captains[1]
-            return potential_captains
-        else:
-            sorted_players = sorted(self.players, key=lambda x: x['mmr'])
-            self.players = sorted_players[0:-2]
-            self.current_drafter = choice(sorted_players[-2:])
-            return sorted_players[-2:]
+        captains, self.players, self.current_drafter = select_captains(self.players)
+        return captains
     
     def _return_players_for_lobby(self):
         lobby_players = []
         for player in self.teams[RADIANT]:
-            player['team'] = 0
+            player.team = 0
             lobby_players.append(player)
         for player in self.teams[DIRE]:
-            player['team'] = 1
+            player.team = 1
             lobby_players.append(player)
         return lobby_players
     
     def create_view_embed(self):
         for player in self.players:
-            player['discord_username'] = '<@' + str(player['discord_id']) + '>'
+            player.discord_username = '<@' + str(player.discord_id) + '>'
 
-        current_drafter_name = self.current_drafter['discord_id']
+        current_drafter_name = self.current_drafter.discord_id
 
-        radiant_names = ['<@' + str(player['discord_id']) + '>'for player in self.teams[RADIANT]]
-        dire_names = ['<@' + str(player['discord_id']) + '>' for player in self.teams[DIRE]]
+        radiant_names = ['<@' + str(player.discord_id) + '>'for player in self.teams[RADIANT]]
+        dire_names = ['<@' + str(player.discord_id) + '>' for player in self.teams[DIRE]]
         embed = Embed(title= 'Draft', color=0x00ff00)
         if len(self.players)>0:
             embed.add_field(name='Player still in pool:', value="", inline=False)
@@ -157,30 +135,17 @@ class DraftView(View):
 
         return embed
     
-    def _get_players_from_db(self) -> List[Any]:
-        players = []
-        for p in self.players:
-            player = execute_function_single_row_return(
-                'get_player', p.id)  # player.id in this case is discord_id
-            if hasattr(p, 'display_name'):
-                player['discord_username'] = p.display_name
-            else:
-                player['discord_username'] = self.bot.get_user(p.id).display_name
-            _add_stats_to_player(player) # add more stats to player
-            players.append(player)
-        self.players = players
-
     def _set_buttons(self):
         for player in self.drafters:
-            label = player['discord_username'][0:MAX_USERNAME_LENGTH]
-            self.buttons[str(player['id'])] = Button(style=ButtonStyle.blurple, label=label, custom_id=str(player['id']))
-            self.buttons[str(player['id'])].callback = self.button_callback
+            label = player.discord_username[0:MAX_USERNAME_LENGTH]
+            self.buttons[str(player.id)] = Button(style=ButtonStyle.blurple, label=label, custom_id=str(player.id))
+            self.buttons[str(player.id)].callback = self.button_callback
             
         for row, player in enumerate(self.players, start=0):
-            label = player['discord_username'][0:MAX_USERNAME_LENGTH]
-            self.buttons[str(player['id'])] = Button(style=ButtonStyle.blurple, label=label, custom_id=str(player['id']),row= row // 4)
-            self.buttons[str(player['id'])].callback = self.button_callback
-            self.add_item(self.buttons[str(player['id'])])
+            label = player.discord_username[0:MAX_USERNAME_LENGTH]
+            self.buttons[str(player.id)] = Button(style=ButtonStyle.blurple, label=label, custom_id=str(player.id),row= row // 4)
+            self.buttons[str(player.id)].callback = self.button_callback
+            self.add_item(self.buttons[str(player.id)])
 
         give_up_button = Button(style=ButtonStyle.red, label=f"Swap drafter", custom_id='end_draft', row=2)
         give_up_button.callback = self.button_callback
@@ -192,56 +157,72 @@ class DraftView(View):
 
     def _show_team_buttons(self, team):
         for player in self.teams[team]:
-            label = player['discord_username'][0:MAX_USERNAME_LENGTH]
-            self.buttons[str(player['id'])] = Button(style=ButtonStyle.blurple, label=label, custom_id=str(player['id']),row= 0)
-            self.buttons[str(player['id'])].callback = self.button_callback
-            self.add_item(self.buttons[str(player['id'])])
+            label = player.discord_username[0:MAX_USERNAME_LENGTH]
+            self.buttons[str(player.id)] = Button(style=ButtonStyle.blurple, label=label, custom_id=str(player.id),row= 0)
+            self.buttons[str(player.id)].callback = self.button_callback
+            self.add_item(self.buttons[str(player.id)])
 
         give_up_button = Button(style=ButtonStyle.red, label=f"Cancel swap drafter", custom_id='end_draft', row=2)
         give_up_button.callback = self.button_callback
         self.add_item(give_up_button)
 
+def get_players_from_db(bot : Bot, members : List[Member]) -> List[Any]:
+    """
+    Loads the players and their stats for a draft, blocking.
+    Run it through discord_db.run_blocking and pass the result to DraftView.
+    Raises ValueError for a player that is not vouched or a user discord does not know.
+    """
+    players = []
+    for p in members:
+        player = get_player(p.id)  # player.id in this case is discord_id
+        if hasattr(p, 'display_name'):
+            player.discord_username = p.display_name
+        else:
+            user = bot.get_user(p.id)
+            if user is None:
+                raise ValueError(f'Unknown discord user {p.id}')
+            player.discord_username = user.display_name
+        _add_stats_to_player(player) # add more stats to player
+        players.append(player)
+    return players
+
 def _add_stats_to_player(player):
-    games_played = execute_function_single_row_return(
-        'get_if_player_played_game', player['id'])
-    if games_played['played'] == 0:
-        player['wins'] = 0
-        player['losses'] = 0
-        player['rank'] = None
-    else:
-        player['rank'] = execute_function_single_row_return(
-            'get_player_rank',player['id'])['rank']
-        wins_and_losses = execute_function_single_row_return(
-            'get_players_wins_and_losses', player['id'])
-        player['wins'] = wins_and_losses['wins']
-        player['losses'] = wins_and_losses['losses']
     try:
-        roles = execute_function_with_return('get_player_role', player['id'])
-        player['roles'] = [role['role'] for role in roles]
+        player_stats = get_player_stats(player.id)
+        player.rank = leaderboard.rank(player.id)
+        player.wins = player_stats['wins']
+        player.losses = player_stats['losses']
+    except ValueError:
+        player.wins = 0
+        player.losses = 0
+        player.rank = None
+    try:
+        roles = get_player_role(player.id)
+        player.roles = [role['role'] for role in roles]
     except ValueError:
-        player['roles'] = []
+        player.roles = []
         pass
     
 def _get_embed_name(player):
-    if player['rank']:
-        return 'Rank: ' + str(player['rank'])
+    if player.rank:
+        return 'Rank: ' + str(player.rank)
     else:
         return 'Unranked'
 
 def _get_embed_value(player):
-        if len(player['roles']) > 0:
-            roles = [str(role) for role in player['roles']]
+        if len(player.roles) > 0:
+            roles = [str(role) for role in player.roles]
             roles = ', '.join(roles)
             return f"""
-            <@{player['discord_id']}> 
-            Wins: {player['wins']}
-            Losses: {player['losses']}
+            <@{player.discord_id}> 
+            Wins: {player.wins}
+            Losses: {player.losses}
             Roles: {roles}
             """
         else:
             return f"""
-            <@{player['discord_id']}> 
-            Wins: {player['wins']}
-            Losses: {player['losses']}
+            <@{player.discord_id}> 
+            Wins: {player.wins}
+            Losses: {player.losses}
             Roles: not set
             """
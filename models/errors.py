@@ -2,4 +2,7 @@ class NoAccountException(Exception):
     pass
 
 class DataBaseErrorNonModified(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class GameAlreadyScored(Exception):
+    pass
@@ -0,0 +1,90 @@
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class PlayerQueue:
+    """
+    Signed up players in the order they joined, keyed by discord id (member.id).
+    Joining, leaving and membership checks are O(1), pop takes the first n players at once.
+    Queues made exclusive with each other never hold a popped player, a player taken into a game
+    from one queue leaves the others in the same call.
+    With a journal (queue_journal.QueueJournal) every change is reported to it under the queue's name,
+    with a position that orders the players, so the queue can be restored after a restart.
+    """
+
+    def __init__(self, name: str = '', journal: Optional[Any] = None) -> None:
+        self.name = name
+        self.journal = journal
+        self._members: Dict[int, Any] = {}  # dicts keep insertion order
+        self._exclusive: List['PlayerQueue'] = []
+        self._front = 0  # position of the first player, returning players go below it
+        self._back = 0  # position of the next player joining
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(list(self._members.values()))
+
+    def __contains__(self, member: Any) -> bool:
+        return getattr(member, 'id', member) in self._members
+
+    def join(self, member: Any) -> bool:
+        # False when the player is already queued
+        if member.id in self._members:
+            return False
+        self._members[member.id] = member
+        if self.journal is not None:
+            self.journal.added(self.name, member.id, self._back)
+        self._back += 1
+        return True
+
+    def leave(self, discord_id: int) -> Optional[Any]:
+        # the removed player, None when the player was not queued
+        member = self._members.pop(discord_id, None)
+        if member is not None and self.journal is not None:
+            self.journal.removed(self.name, discord_id)
+        return member
+
+    def return_to_front(self, members: Iterable[Any]) -> None:
+        # players of an aborted game go ahead of everyone, already queued players keep their place
+        returning = {member.id: member for member in members if member.id not in self._members}
+        self._front -= len(returning)
+        if self.journal is not None:
+            for position, discord_id in enumerate(returning, self._front):
+                self.journal.added(self.name, discord_id, position)
+        returning.update(self._members)
+        self._members = returning
+
+    def pop(self, n: int) -> List[Any]:
+        """
+        Removes and returns the first n players, fewer when the queue is shorter, and takes them
+        out of the exclusive queues.
+        """
+        popped = [self._members.pop(discord_id) for discord_id in list(islice(self._members, n))]
+        if self.journal is not None:
+            for member in popped:
+                self.journal.removed(self.name, member.id)
+        for queue in self._exclusive:
+            for member in popped:
+                if queue._members.pop(member.id, None) is not None and queue.journal is not None:
+                    queue.journal.removed(queue.name, member.id)
+        return popped
+
+    def clear(self) -> None:
+        self._members.clear()
+        if self.journal is not None:
+            self.journal.cleared(self.name)
+
+    def restore(self, entries: List[Tuple[Any, int]]) -> None:
+        # (member, position) pairs ordered by position, as the journal last wrote them, not journaled again
+        self._members = {member.id: member for member, _ in entries}
+        positions = [position for _, position in entries]
+        self._front = min(positions, default=0)
+        self._back = max(positions, default=-1) + 1
+
+
+def exclusive(*queues: PlayerQueue) -> None:
+    # players popped from any of the queues leave all of them
+    for queue in queues:
+        queue._exclusive = [other for other in queues if other is not queue]
@@ -0,0 +1,91 @@
+"""
+Slotted records for the rows of the league tables.
+Queries declare the record they return and the rows are built by a RowFactory, which turns
+the statement's columns into a generated constructor once instead of per row.
+Fields a query does not select are left unset and raise AttributeError when read.
+"""
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+
+class Record:
+    """
+    Fields are attributes, item access is kept so rows read the same as the dict rows
+    of aggregate queries, record['mmr'] is record.mmr.
+    """
+    __slots__ = ()
+
+    def __init__(self, **fields: Any) -> None:
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def __getitem__(self, name: str) -> Any:
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        setattr(self, name, value)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return getattr(self, name, default)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={value!r}' for name, value in self.as_dict().items())
+        return f'{type(self).__name__}({fields})'
+
+
+class Player(Record):
+    # columns of Players, then what the roster, draft and stats code sets on a player
+    __slots__ = ('id', 'discord_id', 'steam_id', 'mmr', 'captain', 'rating_deviation', 'rating_volatility',
+                 'team', 'discord_username', 'rank', 'wins', 'losses', 'roles')
+
+
+class Game(Record):
+    __slots__ = ('id', 'status', 'result', 'steam_match_id', 'type', 'created_at')
+
+
+class GamePlayer(Record):
+    __slots__ = ('id', 'game_id', 'player_id', 'team', 'arrived')
+
+
+class SteamBot(Record):
+    __slots__ = ('id', 'username', 'password', 'status')
+
+
+class RowFactory:
+    """
+    sqlite3 row_factory building records of one type.
+    """
+
+    def __init__(self, record: Type[Record]) -> None:
+        self.record = record
+        self._cached: Tuple[Optional[tuple], Optional[Callable[[tuple], Record]]] = (None, None)
+
+    def __call__(self, cursor: Any, row: tuple) -> Record:
+        # description is the same object for every row of one execution
+        description, make = self._cached
+        if cursor.description is not description:
+            description = cursor.description
+            make = constructor(self.record, tuple(column[0] for column in description))
+            self._cached = (description, make)
+        return make(row)  # type: ignore
+
+
+@lru_cache(maxsize=None)
+def constructor(record: Type[Record], columns: Tuple[str, ...]) -> Callable[[tuple], Record]:
+    """
+    Returns a function building a record from a row with these columns.
+    Raises AttributeError when a column is not a field of the record.
+    """
+    unknown = [column for column in columns if column not in record.__slots__]
+    if unknown:
+        raise AttributeError(f'{record.__name__} has no field {", ".join(unknown)}')
+    assignments = ''.join(f'    self.{column} = row[{index}]\n' for index, column in enumerate(columns))
+    namespace = {'new': object.__new__, 'cls': record}
+    exec(f'def make(row):\n    self = new(cls)\n{assignments}    return self\n', namespace)
+    return namespace['make']
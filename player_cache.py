@@ -0,0 +1,70 @@
+"""
+Player ids of the vouched discord users, kept in memory for the signup paths.
+Loaded with one read at startup and reloaded every CACHE_TTL seconds in the background, which
+picks up players added or removed by other processes (dump, restores) without the hot path
+waiting on the disk. Players vouched by the bot are added as they are written.
+
+    player_ids = PlayerIdCache()
+    player_ids.load()                                 # blocking, before the bot starts
+    player_id = await player_ids.lookup(discord_id)   # None when the user is not vouched
+"""
+import time
+
+from typing import Dict, List, Optional, Tuple
+
+from queries import get_player_id, get_player_ids
+
+CACHE_TTL = 5 * 60  # seconds between reloads, and how long an unknown user is not looked up again
+
+
+class PlayerIdCache:
+    def __init__(self, ttl: float = CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._ids: Dict[int, int] = {}  # discord id to Players.id
+        self._unknown: Dict[int, float] = {}  # discord id to when it may be looked up again
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def load(self) -> int:
+        # blocking, returns the number of players loaded
+        try:
+            rows = get_player_ids()
+        except ValueError:
+            rows = []
+        self._replace(rows)
+        return len(self._ids)
+
+    async def reload(self) -> int:
+        try:
+            rows = await get_player_ids.run_async()
+        except ValueError:
+            rows = []
+        self._replace(rows)
+        return len(self._ids)
+
+    async def lookup(self, discord_id: int) -> Optional[int]:
+        """
+        The player id of a vouched user. A user the cache does not know is read once, vouched
+        elsewhere since the last reload, and then not again for ttl seconds.
+        """
+        player_id = self._ids.get(discord_id)
+        if player_id is not None:
+            return player_id
+        if self._unknown.get(discord_id, 0) > time.monotonic():
+            return None
+        try:
+            player_id = (await get_player_id.run_async(discord_id))['id']
+        except ValueError:
+            self._unknown[discord_id] = time.monotonic() + self.ttl
+            return None
+        self._ids[discord_id] = player_id
+        return player_id
+
+    def add(self, discord_id: int, player_id: int) -> None:
+        self._ids[discord_id] = player_id
+        self._unknown.pop(discord_id, None)
+
+    def _replace(self, rows: List[Tuple[int, int]]) -> None:
+        self._ids = {discord_id: player_id for discord_id, player_id in rows}
+        self._unknown = {}
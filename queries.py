@@ -0,0 +1,472 @@
+"""
+Every statement the league runs, declared once.
+Queries are validated against the migrated schema when this module is imported, and run on
+the pooled connections where sqlite keeps them prepared in the per connection statement cache.
+Fetch queries read through the read only connections, writes through the write connections.
+Rows are the record a query declares (models.records), dicts or plain tuples.
+
+    player = get_player(discord_id)                 # blocking
+    player = await get_player.run_async(discord_id) # on the database executor
+"""
+import sqlite3
+
+from abc import ABC, abstractmethod
+from sqlite3 import Cursor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from discord_db import (
+    MIGRATIONS, STATEMENT_CACHE_SIZE, read_connection, transaction, with_retry, with_retry_async)
+from models.errors import DataBaseErrorNonModified
+from models.records import Game, Player, Record, RowFactory, SteamBot, constructor
+from utility import dict_factory
+
+Row = Dict[str, Any]
+
+
+class Query(ABC):
+    """
+    record is the type of the rows, a Record subclass, dict or tuple.
+    """
+
+    def __init__(self, name: str, sql: str, params: Tuple[str, ...] = (), record: type = dict) -> None:
+        self.name = name
+        self.sql = sql
+        self.params = params
+        self.record = record
+        self.row_factory: Optional[Callable[[Cursor, tuple], Any]] = \
+            None if record is tuple else dict_factory if record is dict else RowFactory(record)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.name}({", ".join(self.params)}))'
+
+    def __call__(self, *args: Any) -> Any:
+        return with_retry(self.name, self._run, self._bind(args))
+
+    async def run_async(self, *args: Any) -> Any:
+        return await with_retry_async(self.name, self._run, self._bind(args))
+
+    def execute_in(self, cursor: Cursor, *args: Any) -> Cursor:
+        # runs on a cursor of an already open transaction, no retries and no result checks
+        cursor.row_factory = self.row_factory
+        return cursor.execute(self.sql, self._bind(args))
+
+    def execute_many_in(self, cursor: Cursor, rows: List[Tuple[Any, ...]]) -> Cursor:
+        for args in rows:
+            self._bind(args)
+        return cursor.executemany(self.sql, rows)
+
+    def _bind(self, args: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        if len(args) != len(self.params):
+            raise TypeError(
+                f'{self.name}() takes {len(self.params)} arguments ({", ".join(self.params)}) but {len(args)} were given')
+        return args
+
+    @abstractmethod
+    def _run(self, args: Tuple[Any, ...]) -> Any:
+        """
+        Runs the statement once with bound arguments, retries are up to the caller.
+        """
+
+
+class Execute(Query):
+    """
+    Write statement, raises DataBaseErrorNonModified when no row was changed.
+    """
+
+    def __call__(self, *args: Any) -> None:
+        with_retry(self.name, self._run, self._bind(args))
+
+    async def run_async(self, *args: Any) -> None:
+        await with_retry_async(self.name, self._run, self._bind(args))
+
+    def _run(self, args: Tuple[Any, ...]) -> None:
+        with transaction() as cursor:
+            cursor.execute(self.sql, args)
+            if cursor.rowcount <= 0:
+                raise DataBaseErrorNonModified('No rows updated')
+
+
+class Insert(Query):
+    """
+    Insert statement, returns the id of the new row.
+    """
+
+    def __call__(self, *args: Any) -> int:
+        return with_retry(self.name, self._run, self._bind(args))
+
+    async def run_async(self, *args: Any) -> int:
+        return await with_retry_async(self.name, self._run, self._bind(args))
+
+    def _run(self, args: Tuple[Any, ...]) -> int:
+        with transaction() as cursor:
+            cursor.execute(self.sql, args)
+            id = cursor.lastrowid
+            if not id:
+                raise ValueError('No rows found')
+        return id
+
+
+class FetchOne(Query):
+    """
+    Returns the first row, raises ValueError when there is none.
+    Runs on the read only connections.
+    """
+
+    def __call__(self, *args: Any) -> Any:
+        return with_retry(self.name, self._run, self._bind(args))
+
+    async def run_async(self, *args: Any) -> Any:
+        return await with_retry_async(self.name, self._run, self._bind(args))
+
+    def _run(self, args: Tuple[Any, ...]) -> Any:
+        with read_connection() as cursor:
+            cursor.row_factory = self.row_factory
+            result = cursor.execute(self.sql, args).fetchone()
+        if not result:
+            raise ValueError('No rows found')
+        return result
+
+
+class FetchAll(Query):
+    """
+    Returns all rows, raises ValueError when there are none.
+    Runs on the read only connections.
+    """
+
+    def __call__(self, *args: Any) -> List[Any]:
+        return with_retry(self.name, self._run, self._bind(args))
+
+    async def run_async(self, *args: Any) -> List[Any]:
+        return await with_retry_async(self.name, self._run, self._bind(args))
+
+    def _run(self, args: Tuple[Any, ...]) -> List[Any]:
+        with read_connection() as cursor:
+            cursor.row_factory = self.row_factory
+            result = cursor.execute(self.sql, args).fetchall()
+        if not result:
+            raise ValueError('No rows found')
+        return result
+
+class Operation:
+    """
+    Several statements in one transaction, retried as a whole on lock errors.
+    The wrapped function gets the transaction cursor as its first argument.
+    """
+
+    def __init__(self, function: Callable[..., Any]) -> None:
+        self.name = function.__name__
+        self.function = function
+        self.__doc__ = function.__doc__
+
+    def __call__(self, *args: Any) -> Any:
+        return with_retry(self.name, self._run, args)
+
+    async def run_async(self, *args: Any) -> Any:
+        return await with_retry_async(self.name, self._run, args)
+
+    def _run(self, args: Tuple[Any, ...]) -> Any:
+        with transaction() as cursor:
+            return self.function(cursor, *args)
+
+# Player
+
+
+get_all_players = FetchAll('get_all_players', 'SELECT * FROM Players', (), Player)
+
+add_player = Insert('add_player', '''INSERT INTO Players(discord_id, steam_id, mmr)
+                        VALUES(?,?,?)''', ('discord_id', 'steam_id', 'mmr'))
+
+get_player_id = FetchOne(
+    'get_player_id', 'SELECT id FROM Players WHERE discord_id = ?', ('discord_id',))
+
+get_player_ids = FetchAll('get_player_ids', 'SELECT discord_id, id FROM Players', (), tuple)
+
+get_player = FetchOne(
+    'get_player', 'SELECT * FROM Players WHERE discord_id = ?', ('discord_id',), Player)
+
+# discord_ids is a JSON array, the players come back in its order, the unvouched ones are left out
+get_players_by_ids = FetchAll(
+    'get_players_by_ids', '''SELECT p.* FROM json_each(?) j JOIN Players p ON p.discord_id = j.value
+                             ORDER BY j.key''', ('discord_ids',), Player)
+
+update_player_mmr_won = Execute(
+    'update_player_mmr_won', 'UPDATE Players SET mmr = mmr + ?2 WHERE id = ?1', ('id', 'elo_change'))
+
+update_player_mmr_lost = Execute(
+    'update_player_mmr_lost', 'UPDATE Players SET mmr = mmr - ?2 WHERE id = ?1', ('id', 'elo_change'))
+
+apply_player_mmr_delta = Execute(
+    'apply_player_mmr_delta', 'UPDATE Players SET mmr = mmr + ?2 WHERE id = ?1', ('id', 'delta'))
+
+set_player_mmr = Execute(
+    'set_player_mmr', 'UPDATE Players SET mmr = ?2 WHERE id = ?1', ('id', 'mmr'))
+
+reset_all_player_mmr = Execute(
+    'reset_all_player_mmr', 'UPDATE Players SET mmr = 1000, rating_deviation = NULL, rating_volatility = NULL')
+
+set_player_rating_state = Execute(
+    'set_player_rating_state', 'UPDATE Players SET rating_deviation = ?2, rating_volatility = ?3 WHERE id = ?1',
+    ('id', 'rating_deviation', 'rating_volatility'))
+
+set_player_captain = Execute(
+    'set_player_captain', 'UPDATE Players SET captain = 1 WHERE id = ?', ('id',))
+
+# PlayerStats
+
+
+get_player_stats = FetchOne(
+    'get_player_stats', 'SELECT * FROM PlayerStats WHERE player_id = ?', ('player_id',))
+
+record_player_result = Execute('record_player_result', '''INSERT INTO PlayerStats(player_id, games, wins, losses, last_played, streak)
+                        VALUES(?1, 1, ?2, 1 - ?2, ?3, CASE WHEN ?2 THEN 1 ELSE -1 END)
+                        ON CONFLICT(player_id) DO UPDATE SET
+                        games = games + 1,
+                        wins = wins + excluded.wins,
+                        losses = losses + excluded.losses,
+                        last_played = MAX(last_played, excluded.last_played),
+                        streak = CASE WHEN excluded.last_played < last_played THEN streak
+                                      WHEN excluded.streak * streak > 0 THEN streak + excluded.streak
+                                      ELSE excluded.streak END''',
+                               ('player_id', 'won', 'game_id'))
+
+# games count in id order like fill_player_stats, a game scored after a newer one recounts the streak
+refresh_player_streak = Execute('refresh_player_streak', '''UPDATE PlayerStats SET streak = (
+                        WITH history AS (
+                            SELECT g.id AS game_id, gp.team = g.result AS won
+                            FROM GamePlayers gp JOIN Game g ON g.id = gp.game_id
+                            WHERE gp.player_id = ?1 AND g.status = 'OVER'),
+                        last AS (SELECT won FROM history ORDER BY game_id DESC LIMIT 1)
+                        SELECT (CASE WHEN last.won THEN 1 ELSE -1 END) * COUNT(*) FROM history, last
+                        WHERE history.game_id > COALESCE((SELECT MAX(game_id) FROM history WHERE won <> last.won), 0))
+                        WHERE player_id = ?1 AND last_played > ?2''', ('player_id', 'game_id'))
+
+# PlayerRoles
+
+
+delete_player_roles = Execute(
+    'delete_player_roles', 'DELETE FROM PlayerRoles WHERE player_id = ?', ('player_id',))
+
+set_player_role = Execute(
+    'set_player_role', 'INSERT INTO PlayerRoles(player_id, role) VALUES(?,?)', ('player_id', 'role'))
+
+get_player_role = FetchAll(
+    'get_player_role', 'SELECT role FROM PlayerRoles WHERE player_id = ?', ('player_id',))
+
+# player_ids is a JSON array, every queued player's roles in one read
+get_roles_of_players = FetchAll(
+    'get_roles_of_players', 'SELECT player_id, role FROM PlayerRoles WHERE player_id IN (SELECT value FROM json_each(?))',
+    ('player_ids',), tuple)
+
+# Game
+
+
+get_game = FetchOne('get_game', 'SELECT * FROM Game WHERE id = ?', ('id',), Game)
+
+add_game = Insert(
+    'add_game', '''INSERT INTO Game(status, result, steam_match_id, type, created_at) VALUES('PREGAME', NULL, NULL, ?, CURRENT_TIMESTAMP)''', ('type',))
+
+set_game_status_aborted = Execute(
+    'set_game_status_aborted', '''UPDATE Game SET status = 'ABORTED' WHERE id = ?''', ('id',))
+
+set_game_status_pregame = Execute(
+    'set_game_status_pregame', '''UPDATE Game SET status = 'PREGAME' WHERE id = ?''', ('id',))
+
+get_game_id_where_status_pregame = FetchOne(
+    'get_game_id_where_status_pregame', '''SELECT id FROM Game WHERE status = 'PREGAME' LIMIT 1''')
+
+set_game_status_hosted = Execute(
+    'set_game_status_hosted', '''UPDATE Game SET status = 'HOSTED' WHERE id = ?''', ('game_id',))
+
+score_game = Execute(
+    'score_game', '''UPDATE Game SET result = ?2, status = 'OVER', steam_match_id = ?3 WHERE id = ?1''', ('game_id', 'result', 'steam_match_id'))
+
+set_game_status_started = Execute(
+    'set_game_status_started', '''UPDATE Game SET status = 'STARTED' WHERE id = ?''', ('game_id',))
+
+get_game_id_where_status_rehost = FetchOne(
+    'get_game_id_where_status_rehost', '''SELECT id FROM Game WHERE status = 'REHOST' LIMIT 1''')
+
+get_game_id_where_status_cancel = FetchOne(
+    'get_game_id_where_status_cancel', '''SELECT id FROM Game WHERE status = 'CANCEL' LIMIT 1''')
+
+set_game_status_cancel = Execute(
+    'set_game_status_cancel', '''UPDATE Game SET status = 'CANCEL' WHERE id = ?''', ('game_id',))
+
+set_game_status_rehost = Execute(
+    'set_game_status_rehost', '''UPDATE Game SET status = 'REHOST' WHERE id = ?''', ('game_id',))
+
+get_games_where_status_over = FetchAll(
+    'get_games_where_status_over', '''SELECT * FROM Game WHERE status = 'OVER' ''', (), Game)
+
+get_scored_game_results = FetchAll(
+    'get_scored_game_results', '''SELECT id, result FROM Game WHERE status = 'OVER' ORDER BY id''', (), tuple)
+
+get_scored_games_with_steam_match_id = FetchAll(
+    'get_scored_games_with_steam_match_id', '''SELECT steam_match_id FROM Game WHERE status = 'OVER' and steam_match_id is not NULL and steam_match_id <> 0''')
+
+get_active_games = FetchAll('get_active_games', '''SELECT * FROM Game WHERE status = 'STARTED' ''', (), Game)
+
+set_game_status_timeout = Execute(
+    'set_game_status_timeout', '''UPDATE Game SET status = 'TIMEOUT' WHERE id = ?''', ('game_id',))
+
+get_game_where_status_timeout = FetchAll(
+    'get_game_where_status_timeout', '''SELECT * FROM Game WHERE status = 'TIMEOUT' ''', (), Game)
+
+get_archivable_games = FetchAll(
+    'get_archivable_games', '''SELECT id FROM Game WHERE status IN ('ABORTED', 'TIMEOUT', 'CANCEL')
+                                AND (created_at IS NULL OR created_at < ?1)
+                                AND id < (SELECT MAX(id) FROM Game) ORDER BY id LIMIT ?2''', ('created_before', 'limit'))
+
+archive_game = Execute('archive_game', '''INSERT INTO ArchivedGame(id, status, result, steam_match_id, type, created_at)
+                        SELECT id, status, result, steam_match_id, type, created_at FROM Game WHERE id = ?''', ('id',))
+
+archive_game_players = Execute('archive_game_players', '''INSERT INTO ArchivedGamePlayers(id, game_id, player_id, team, arrived)
+                        SELECT id, game_id, player_id, team, arrived FROM GamePlayers WHERE game_id = ?''', ('game_id',))
+
+archive_game_args = Execute('archive_game_args', '''INSERT INTO ArchivedGameArgs(id, game_id, lobby_name, lobby_password)
+                        SELECT id, game_id, lobby_name, lobby_password FROM GameArgs WHERE game_id = ?''', ('game_id',))
+
+delete_game = Execute('delete_game', 'DELETE FROM Game WHERE id = ?', ('id',))
+
+delete_game_players = Execute('delete_game_players', 'DELETE FROM GamePlayers WHERE game_id = ?', ('game_id',))
+
+delete_game_args = Execute('delete_game_args', 'DELETE FROM GameArgs WHERE game_id = ?', ('game_id',))
+
+# GamePlayers
+
+
+add_player_to_game = Execute(
+    'add_player_to_game', 'INSERT INTO GamePlayers(game_id, player_id, team) VALUES(?,?,?)', ('game_id', 'player_id', 'team'))
+
+get_all_players_from_game = FetchAll(
+    'get_all_players_from_game', '''SELECT p.id, discord_id, steam_id, mmr, rating_deviation, rating_volatility, gp.team as team
+                                   FROM GamePlayers gp join Players p on gp.player_id = p.id WHERE game_id = ?''', ('game_id',), Player)
+
+get_scored_game_rosters = FetchAll(
+    'get_scored_game_rosters', '''SELECT gp.game_id, gp.player_id, gp.team FROM GamePlayers gp join Game g on gp.game_id = g.id join Players p on gp.player_id = p.id WHERE g.status = 'OVER' ORDER BY gp.game_id, gp.id''', (), tuple)
+
+set_player_arrived = Execute(
+    'set_player_arrived', 'UPDATE GamePlayers SET arrived = 1 WHERE game_id = ? and player_id = ?', ('game_id', 'player_id'))
+
+set_player_left = Execute(
+    'set_player_left', 'UPDATE GamePlayers SET arrived = 0 WHERE game_id = ? and player_id = ?', ('game_id', 'player_id'))
+
+get_players_arrived = FetchAll(
+    'get_players_arrived', 'SELECT p.discord_id as id FROM GamePlayers gp JOIN Players p on gp.player_id = p.id WHERE game_id = ? and arrived = 1', ('game_id',))
+
+reset_all_players_arrived = Execute(
+    'reset_all_players_arrived', 'UPDATE GamePlayers SET arrived = 0 WHERE game_id = ?', ('game_id',))
+
+# RatingChanges
+
+
+add_rating_change = Execute(
+    'add_rating_change', 'INSERT INTO RatingChanges(game_id, player_id, mmr_before, delta) VALUES(?,?,?,?)', ('game_id', 'player_id', 'mmr_before', 'delta'))
+
+# GameArgs
+
+
+add_game_args = Execute(
+    'add_game_args', 'INSERT INTO GameArgs(game_id, lobby_name, lobby_password) VALUES(?,?,?)', ('game_id', 'lobby_name', 'lobby_password'))
+
+get_game_args = FetchOne(
+    'get_game_args', 'SELECT lobby_name,lobby_password FROM GameArgs WHERE game_id = ?', ('game_id',))
+
+# SteamBots
+
+
+add_bot = Execute(
+    'add_bot', 'INSERT INTO SteamBots(username, password, status) VALUES(?,?,0)', ('username', 'password'))
+
+get_free_bot = FetchOne('get_free_bot', 'SELECT * FROM SteamBots WHERE status = 0 LIMIT 1', (), SteamBot)
+
+get_steam_bot = FetchOne('get_steam_bot', 'SELECT * FROM SteamBots WHERE id = ?', ('id',), SteamBot)
+
+reserve_bot = Execute('reserve_bot', 'UPDATE SteamBots SET status = 1 WHERE id = ?', ('id',))
+
+get_bot_from_username = FetchOne(
+    'get_bot_from_username', 'SELECT * FROM SteamBots WHERE username = ?', ('username',), SteamBot)
+
+free_bot = Execute('free_bot', 'UPDATE SteamBots SET status = 0 WHERE username = ?', ('username',))
+
+# Agreagtion
+
+
+get_leaderboards = FetchAll(
+    'get_leaderboards', 'SELECT p.id, p.discord_id, p.mmr FROM Players p JOIN PlayerStats s ON s.player_id = p.id ORDER BY p.mmr DESC', (), Player)
+
+# QueueEntries
+
+
+get_queue_entries = FetchAll(
+    'get_queue_entries', 'SELECT queue, discord_id, position FROM QueueEntries ORDER BY queue, position', (), tuple)
+
+set_queue_entry = Execute(
+    'set_queue_entry', 'INSERT OR REPLACE INTO QueueEntries(queue, discord_id, position) VALUES(?,?,?)',
+    ('queue', 'discord_id', 'position'))
+
+remove_queue_entry = Execute(
+    'remove_queue_entry', 'DELETE FROM QueueEntries WHERE queue = ? AND discord_id = ?', ('queue', 'discord_id'))
+
+clear_queue_entries = Execute('clear_queue_entries', 'DELETE FROM QueueEntries WHERE queue = ?', ('queue',))
+
+
+# Operations
+
+
+@Operation
+def create_game_with_players(cursor: Cursor, type: str, game_name: str, lobby_password: str,
+                             players: List[Player]) -> Tuple[int, str]:
+    """
+    Writes the Game, its GameArgs and every GamePlayers row with a single commit,
+    the orchestrator never sees a PREGAME game without its lobby or players.
+    Returns the game id and the lobby name.
+    """
+    game_id = add_game.execute_in(cursor, type).lastrowid
+    lobby_name = game_name + str(game_id)
+    add_game_args.execute_in(cursor, game_id, lobby_name, lobby_password)
+    add_player_to_game.execute_many_in(
+        cursor, [(game_id, player.id, player.team) for player in players])
+    return game_id, lobby_name
+
+
+@Operation
+def write_queue_journal(cursor: Cursor, cleared: List[str], entries: List[Tuple[str, int, int]],
+                        removed: List[Tuple[str, int]]) -> None:
+    """
+    Applies a batch of queue changes with a single commit, the cleared queues first.
+    entries are (queue, discord_id, position) and removed (queue, discord_id), one per player and queue.
+    """
+    clear_queue_entries.execute_many_in(cursor, [(queue,) for queue in cleared])
+    remove_queue_entry.execute_many_in(cursor, removed)
+    set_queue_entry.execute_many_in(cursor, entries)
+
+
+def _validate(registry: Dict[str, Query]) -> None:
+    # compile every statement against an in memory copy of the schema, typos fail the import
+    if len(registry) > STATEMENT_CACHE_SIZE:
+        raise ValueError(f'{len(registry)} queries do not fit the statement cache of {STATEMENT_CACHE_SIZE}')
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = dict_factory
+    cursor = conn.cursor()
+    for _, _, migration in MIGRATIONS:
+        migration(cursor)
+    for name, query in registry.items():
+        if name != query.name:
+            raise ValueError(f'Query {query.name} is registered as {name}')
+        try:
+            cursor.execute('EXPLAIN ' + query.sql, (None, ) * len(query.params))
+        except sqlite3.Error as e:
+            raise ValueError(f'Invalid query {name}: {e}') from e
+        if isinstance(query.record, type) and issubclass(query.record, Record):
+            # every selected column has to be a field of the record
+            cursor.execute(query.sql, (None, ) * len(query.params))
+            try:
+                constructor(query.record, tuple(column[0] for column in cursor.description))
+            except AttributeError as e:
+                raise ValueError(f'Invalid query {name}: {e}') from e
+    conn.close()
+
+
+REGISTRY: Dict[str, Query] = {name: query for name, query in globals().items() if isinstance(query, Query)}
+_validate(REGISTRY)
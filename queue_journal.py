@@ -0,0 +1,115 @@
+"""
+Write behind journal of the signup queues, a restart or crash keeps everyone who was waiting.
+The queues report every change, the changes are coalesced in memory, only the last one per player
+and queue is kept, and a background task writes them every FLUSH_INTERVAL seconds in one
+transaction. A signup never waits on the disk and a burst of signups costs a single commit.
+On startup restore loads the queues back in their order with one read.
+
+    journal = QueueJournal()
+    journal.attach(queue, draft_queue)
+    journal.restore()                  # blocking, before the bot starts
+    await journal.flush_async()        # every FLUSH_INTERVAL seconds
+    journal.flush()                    # blocking, on shutdown
+"""
+import sqlite3
+
+from typing import Dict, List, Optional, Set, Tuple
+
+from models.player import Player
+from models.queue import PlayerQueue
+from queries import get_queue_entries, write_queue_journal
+
+# changes of the last FLUSH_INTERVAL seconds are lost on a crash, the queues rarely change faster
+# than the players can click. WAL with synchronous=NORMAL leaves the fsync to the next checkpoint
+FLUSH_INTERVAL = 1.0  # seconds
+
+Pending = Dict[Tuple[str, int], Optional[int]]  # (queue, discord_id) to position, None once removed
+
+
+class QueueJournal:
+    def __init__(self) -> None:
+        self.queues: Dict[str, PlayerQueue] = {}
+        self._cleared: Set[str] = set()
+        self._pending: Pending = {}
+
+    def __len__(self) -> int:
+        # changes not written yet
+        return len(self._cleared) + len(self._pending)
+
+    def attach(self, *queues: PlayerQueue) -> None:
+        for queue in queues:
+            if not queue.name or queue.name in self.queues:
+                raise ValueError(f'Journaled queues need distinct names, got {queue.name!r}')
+            queue.journal = self
+            self.queues[queue.name] = queue
+
+    def added(self, queue: str, discord_id: int, position: int) -> None:
+        self._pending[(queue, discord_id)] = position
+
+    def removed(self, queue: str, discord_id: int) -> None:
+        self._pending[(queue, discord_id)] = None
+
+    def cleared(self, queue: str) -> None:
+        # the clear is written first, earlier changes of the queue no longer matter
+        self._cleared.add(queue)
+        self._pending = {key: position for key, position in self._pending.items() if key[0] != queue}
+
+    def restore(self) -> int:
+        """
+        Loads the attached queues as the journal last wrote them, players as models.player.Player.
+        Returns the number of players restored.
+        """
+        try:
+            rows = get_queue_entries()
+        except ValueError:
+            rows = []
+        entries: Dict[str, List[Tuple[Player, int]]] = {name: [] for name in self.queues}
+        for queue, discord_id, position in rows:
+            if queue in entries:
+                entries[queue].append((Player(discord_id), position))
+        for name, queue in self.queues.items():
+            queue.restore(entries[name])
+        return sum(len(queue) for queue in self.queues.values())
+
+    def flush(self) -> int:
+        # blocking, for shutdown, returns the number of changes written
+        batch = self._take()
+        if not batch[0] and not batch[1]:
+            return 0
+        try:
+            write_queue_journal(*self._statements(*batch))
+        except sqlite3.Error:
+            self._put_back(*batch)
+            raise
+        return len(batch[0]) + len(batch[1])
+
+    async def flush_async(self) -> int:
+        batch = self._take()
+        if not batch[0] and not batch[1]:
+            return 0
+        try:
+            await write_queue_journal.run_async(*self._statements(*batch))
+        except sqlite3.Error:
+            self._put_back(*batch)
+            raise
+        return len(batch[0]) + len(batch[1])
+
+    def _take(self) -> Tuple[Set[str], Pending]:
+        batch = self._cleared, self._pending
+        self._cleared, self._pending = set(), {}
+        return batch
+
+    def _put_back(self, cleared: Set[str], pending: Pending) -> None:
+        # a failed batch goes before the changes made while it was being written
+        pending = {key: position for key, position in pending.items() if key[0] not in self._cleared}
+        pending.update(self._pending)
+        self._pending = pending
+        self._cleared |= cleared
+
+    @staticmethod
+    def _statements(cleared: Set[str], pending: Pending) -> Tuple[List[str], List[Tuple[str, int, int]],
+                                                                   List[Tuple[str, int]]]:
+        entries = [(queue, discord_id, position) for (queue, discord_id), position in pending.items()
+                   if position is not None]
+        removed = [key for key, position in pending.items() if position is None]
+        return sorted(cleared), entries, removed
@@ -0,0 +1,260 @@
+"""
+Rating models over numeric arrays.
+Games are given as entries, one per player per game grouped by game, each with the game's index,
+the player's team and the player's rating state before the game: mmr, deviation and volatility.
+rate takes a batch of games rated from the same state, independent of each other, a single game
+when scoring. replay rates a whole history in order, every game seeing the ratings the games
+before it left.
+
+    deltas, deviations, volatilities = model.rate(games, teams, results, mmr, deviations, volatilities)
+
+mmr stays an integer, deltas are rounded. Elo ignores deviation and volatility and returns them as
+they were. The model the bot scores with is set once at startup with use_model.
+"""
+import math
+
+import numpy as np
+
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+
+ELO_K_FACTOR = 50  # The K-factor determines how much the ELO ratings change after a match.
+TESTING_ELO_CHANGE = 25  # only applys to testing when a team is empty
+STARTING_MMR = 1000  # reset_all_player_mmr
+
+# Glicko-2 on the mmr scale, a player without games starts at DEFAULT_DEVIATION and DEFAULT_VOLATILITY
+GLICKO_SCALE = 173.7178
+DEFAULT_DEVIATION = 350.0
+DEFAULT_VOLATILITY = 0.06
+GLICKO_TAU = 0.5  # how fast volatility moves
+VOLATILITY_EPSILON = 1e-6
+
+Rated = Tuple[np.ndarray, np.ndarray, np.ndarray]  # deltas, deviations and volatilities per entry
+Replayed = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+def expected_score(radiant_elo: float, dire_elo: float) -> float:
+    # chance of radiant winning by the ELO expectation
+    return 1 / (1 + 10 ** ((dire_elo - radiant_elo) / 400))
+
+
+def team_sums(games: np.ndarray, teams: np.ndarray, values: np.ndarray, count: int) -> np.ndarray:
+    # (count, 2) sums of values per game and team
+    return np.bincount(games * 2 + teams, weights=values, minlength=2 * count).reshape(count, 2)
+
+
+def game_bounds(games: np.ndarray, count: int) -> List[int]:
+    # entries of game i are bounds[i]:bounds[i + 1], games grouped in order
+    return np.searchsorted(games, np.arange(count + 1)).tolist()
+
+
+def replay_in_waves(model: 'RatingModel', games: np.ndarray, players: np.ndarray, teams: np.ndarray,
+                    results: np.ndarray, player_count: int, starting_mmr: int = STARTING_MMR) -> Replayed:
+    """
+    A replay for any model over its rate, consecutive games without a shared player are rated
+    as one batch.
+    """
+    mmr = np.full(player_count, starting_mmr, dtype=np.int64)
+    deviations = np.full(player_count, DEFAULT_DEVIATION)
+    volatilities = np.full(player_count, DEFAULT_VOLATILITY)
+    mmr_before = np.zeros(len(players), dtype=np.int64)
+    deltas = np.zeros(len(players), dtype=np.int64)
+    bounds = game_bounds(games, len(results))
+    entry_players: List[int] = players.tolist()
+    first = 0
+    seen: set = set()
+    for game in range(len(results) + 1):
+        roster = entry_players[bounds[game]:bounds[game + 1]] if game < len(results) else []
+        if game < len(results) and seen.isdisjoint(roster):
+            seen.update(roster)
+            continue
+        start, end = bounds[first], bounds[game]
+        if end > start:
+            wave = players[start:end]
+            mmr_before[start:end] = mmr[wave]
+            deltas[start:end], deviations[wave], volatilities[wave] = model.rate(
+                games[start:end] - first, teams[start:end], results[first:game],
+                mmr[wave], deviations[wave], volatilities[wave])
+            mmr[wave] += deltas[start:end]
+        first = game
+        seen = set(roster)
+    return mmr, deviations, volatilities, mmr_before, deltas
+
+
+class RatingModel(ABC):
+    name = ''
+    uses_deviation = False  # whether deviation and volatility are worth storing
+
+    @abstractmethod
+    def rate(self, games: np.ndarray, teams: np.ndarray, results: np.ndarray, mmr: np.ndarray,
+             deviations: np.ndarray, volatilities: np.ndarray) -> Rated:
+        """
+        Rates a batch of independent games. Returns the delta, deviation and volatility per entry.
+        """
+
+    @abstractmethod
+    def replay(self, games: np.ndarray, players: np.ndarray, teams: np.ndarray, results: np.ndarray,
+               player_count: int, starting_mmr: int = STARTING_MMR) -> Replayed:
+        """
+        Rates every game in order starting every player at starting_mmr and the default state.
+        players are dense indexes below player_count. Returns the final mmr, deviation and volatility
+        per player, and mmr before the game and delta per entry. replay_in_waves does it for any rate.
+        """
+
+
+class EloModel(RatingModel):
+    """
+    Team average Elo, the winners gain and the losers lose the same k * (score - expected) rounded.
+    """
+    name = 'elo'
+
+    def __init__(self, k: float = ELO_K_FACTOR) -> None:
+        self.k = k
+
+    def rate(self, games: np.ndarray, teams: np.ndarray, results: np.ndarray, mmr: np.ndarray,
+             deviations: np.ndarray, volatilities: np.ndarray) -> Rated:
+        count = len(results)
+        sizes = team_sums(games, teams, np.ones(len(games)), count)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            averages = np.round(team_sums(games, teams, mmr.astype(np.float64), count) / sizes)
+            expected_radiant = 1 / (1 + 10 ** ((averages[:, 1] - averages[:, 0]) / 400))
+        changes = np.round(np.abs(self.k * ((results == 0) - expected_radiant)))
+        changes = np.where(sizes.min(axis=1) > 0, changes, TESTING_ELO_CHANGE).astype(np.int64)
+        deltas = np.where(teams == results[games], changes[games], -changes[games])
+        return deltas, deviations, volatilities
+
+    def replay(self, games: np.ndarray, players: np.ndarray, teams: np.ndarray, results: np.ndarray,
+               player_count: int, starting_mmr: int = STARTING_MMR) -> Replayed:
+        # a game at a time over plain lists rather than numpy. The games are sequential, a league
+        # rarely has two in a row without a shared player, so numpy only gets a game or two per call.
+        # Measured on 20,000 games of 10 players: lists take 100-115 ms, replay_in_waves 200-560 ms
+        # and np.add.at per game about 320-370 ms (200 and 2,000 players)
+        ratings = [starting_mmr] * player_count
+        entry_players: List[int] = players.tolist()
+        entry_teams: List[int] = teams.tolist()
+        game_results: List[int] = results.tolist()
+        bounds = game_bounds(games, len(game_results))
+        mmr_before = [0] * len(entry_players)
+        deltas = [0] * len(entry_players)
+        for game, result in enumerate(game_results):
+            start, end = bounds[game], bounds[game + 1]
+            sums = [0, 0]
+            sizes = [0, 0]
+            for entry in range(start, end):
+                sums[entry_teams[entry]] += ratings[entry_players[entry]]
+                sizes[entry_teams[entry]] += 1
+            if sizes[0] > 0 and sizes[1] > 0:
+                expected_radiant = expected_score(round(sums[0] / sizes[0]), round(sums[1] / sizes[1]))
+                change = round(abs(self.k * ((1 if result == 0 else 0) - expected_radiant)))
+            else:
+                change = TESTING_ELO_CHANGE
+            for entry in range(start, end):
+                player = entry_players[entry]
+                delta = change if entry_teams[entry] == result else -change
+                mmr_before[entry] = ratings[player]
+                deltas[entry] = delta
+                ratings[player] += delta
+        return (np.array(ratings, dtype=np.int64), np.full(player_count, DEFAULT_DEVIATION),
+                np.full(player_count, DEFAULT_VOLATILITY), np.array(mmr_before, dtype=np.int64),
+                np.array(deltas, dtype=np.int64))
+
+
+class Glicko2Model(RatingModel):
+    """
+    Glicko-2 with every game its own rating period and the other team as a single opponent,
+    its mean rating and root mean square deviation. Uncertain players move more and settle as
+    their deviation shrinks, the volatility follows how surprising their results are.
+    """
+    name = 'glicko2'
+    uses_deviation = True
+
+    def __init__(self, tau: float = GLICKO_TAU) -> None:
+        self.tau = tau
+
+    def rate(self, games: np.ndarray, teams: np.ndarray, results: np.ndarray, mmr: np.ndarray,
+             deviations: np.ndarray, volatilities: np.ndarray) -> Rated:
+        count = len(results)
+        mu = mmr / GLICKO_SCALE
+        phi = deviations / GLICKO_SCALE
+        sizes = team_sums(games, teams, np.ones(len(games)), count)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            team_mu = team_sums(games, teams, mu, count) / sizes
+            team_phi = np.sqrt(team_sums(games, teams, phi ** 2, count) / sizes)
+        rated = (sizes.min(axis=1) > 0)[games]
+        opponents = 1 - teams
+        # a player without opponents is rated against itself, a finite no-op replaced below
+        mu_opponent = np.where(rated, team_mu[games, opponents], mu)
+        phi_opponent = np.where(rated, team_phi[games, opponents], phi)
+        g = 1 / np.sqrt(1 + 3 * phi_opponent ** 2 / math.pi ** 2)
+        expected = 1 / (1 + np.exp(-g * (mu - mu_opponent)))
+        score = (teams == results[games]).astype(np.float64)
+        variance = 1 / (g ** 2 * expected * (1 - expected))
+        improvement = variance * g * (score - expected)
+        sigma = self._volatility(improvement, phi, variance, volatilities)
+        phi_new = 1 / np.sqrt(1 / (phi ** 2 + sigma ** 2) + 1 / variance)
+        mu_new = mu + phi_new ** 2 * g * (score - expected)
+        deltas = np.round(mu_new * GLICKO_SCALE).astype(np.int64) - mmr
+        testing = np.where(score == 1, TESTING_ELO_CHANGE, -TESTING_ELO_CHANGE)
+        return (np.where(rated, deltas, testing), np.where(rated, phi_new * GLICKO_SCALE, deviations),
+                np.where(rated, sigma, volatilities))
+
+    def replay(self, games: np.ndarray, players: np.ndarray, teams: np.ndarray, results: np.ndarray,
+               player_count: int, starting_mmr: int = STARTING_MMR) -> Replayed:
+        return replay_in_waves(self, games, players, teams, results, player_count, starting_mmr)
+
+    def _volatility(self, improvement: np.ndarray, phi: np.ndarray, variance: np.ndarray,
+                    volatilities: np.ndarray) -> np.ndarray:
+        # the Illinois iteration of Glicko-2 step 5 on every entry at once
+        a = np.log(volatilities ** 2)
+        tau2 = self.tau ** 2
+        excess = improvement ** 2 - phi ** 2 - variance
+
+        def f(x: np.ndarray) -> np.ndarray:
+            ex = np.exp(x)
+            return ex * (excess - ex) / (2 * (phi ** 2 + variance + ex) ** 2) - (x - a) / tau2
+
+        low = a.copy()
+        with np.errstate(invalid='ignore'):
+            high = np.where(excess > 0, np.log(np.maximum(excess, 1e-300)), a - self.tau)
+        f_high = f(high)
+        while True:
+            below = (excess <= 0) & (f_high < 0)
+            if not below.any():
+                break
+            high = np.where(below, high - self.tau, high)
+            f_high = f(high)
+        f_low = f(low)
+        for _ in range(100):
+            active = np.abs(high - low) > VOLATILITY_EPSILON
+            if not active.any():
+                break
+            middle = low + (low - high) * f_low / (f_high - f_low)
+            f_middle = f(middle)
+            crossed = f_middle * f_high <= 0
+            low = np.where(active & crossed, high, low)
+            f_low = np.where(active, np.where(crossed, f_high, f_low / 2), f_low)
+            high = np.where(active, middle, high)
+            f_high = np.where(active, f_middle, f_high)
+        return np.exp(low / 2)
+
+
+MODELS = {EloModel.name: EloModel, Glicko2Model.name: Glicko2Model}
+
+_model: RatingModel = EloModel()
+
+
+def make_model(name: str = EloModel.name, k: Optional[float] = None) -> RatingModel:
+    if name not in MODELS:
+        raise ValueError(f'Unknown rating model {name}, use one of {", ".join(MODELS)}')
+    if name == EloModel.name:
+        return EloModel(ELO_K_FACTOR if k is None else k)
+    return MODELS[name]()
+
+
+def use_model(model: RatingModel) -> None:
+    global _model
+    _model = model
+
+
+def current_model() -> RatingModel:
+    return _model
@@ -0,0 +1,49 @@
+"""
+In memory mmr replay used by recalculate_mmr.
+The scored history is loaded with two bulk reads into numpy arrays with players mapped to dense
+indexes, replayed without touching the database and written back by the caller in bulk.
+The rating model walks the games in order, every game depends on the ratings the previous games left.
+"""
+import numpy as np
+
+from sqlite3 import Cursor
+from typing import Optional
+
+from queries import get_scored_game_results, get_scored_game_rosters
+from rating import STARTING_MMR, RatingModel, Replayed, current_model
+
+
+class History:
+    """
+    Scored games in order and their rosters as flat entries, one entry per player per game,
+    grouped by game in the same order as the games.
+    """
+
+    def __init__(self, game_ids: np.ndarray, results: np.ndarray,
+                 entry_game_ids: np.ndarray, entry_player_ids: np.ndarray, entry_teams: np.ndarray) -> None:
+        self.game_ids = game_ids
+        self.results = results
+        self.entry_game_ids = entry_game_ids
+        self.entry_player_ids = entry_player_ids
+        self.entry_teams = entry_teams
+        # dense indexes, games by position in game_ids and players by position in player_ids
+        self.entry_games = np.searchsorted(game_ids, entry_game_ids)
+        self.player_ids, self.entry_players = np.unique(entry_player_ids, return_inverse=True)
+
+
+def load_history(cursor: Cursor) -> History:
+    # both queries return plain tuples
+    games = np.array(get_scored_game_results.execute_in(cursor).fetchall(), dtype=np.int64).reshape(-1, 2)
+    rosters = np.array(get_scored_game_rosters.execute_in(cursor).fetchall(), dtype=np.int64).reshape(-1, 3)
+    return History(games[:, 0], games[:, 1], rosters[:, 0], rosters[:, 1], rosters[:, 2])
+
+
+def replay(history: History, model: Optional[RatingModel] = None, starting_mmr: int = STARTING_MMR) -> Replayed:
+    """
+    Replays every game starting everyone at starting_mmr with the model the bot scores with.
+    Returns the final mmr, deviation and volatility per history.player_ids, and mmr before the
+    game and delta per entry.
+    """
+    model = model or current_model()
+    return model.replay(history.entry_games, history.entry_players, history.entry_teams, history.results,
+                        len(history.player_ids), starting_mmr)
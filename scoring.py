@@ -0,0 +1,126 @@
+"""
+Scoring games. Status, every player's mmr, their PlayerStats and the rating change log are
+written in one transaction, a failure never leaves a game half applied.
+Ratings come from the rating model set with rating.use_model, Elo unless the league picks another.
+PlayerStats streak and last_played follow game id order whatever order games are scored in, the
+same order rebuild_player_stats and recalculate_mmr replay.
+The cached leaderboard follows once the transaction commits.
+"""
+import numpy as np
+
+from functools import partial
+from sqlite3 import Cursor
+from typing import List
+
+from discord_db import after_commit, fill_player_stats
+
+from models.errors import GameAlreadyScored
+from models.records import Player
+from queries import (
+    Operation, Row, add_rating_change, apply_player_mmr_delta, get_all_players_from_game, get_game,
+    record_player_result, refresh_player_streak, reset_all_player_mmr, score_game, set_player_mmr,
+    set_player_rating_state)
+from leaderboard import leaderboard
+from rating import DEFAULT_DEVIATION, DEFAULT_VOLATILITY, Rated, current_model
+from replay import load_history, replay
+
+
+def rate_game(players: List[Player], result: int) -> Rated:
+    """
+    Rates one game with the model the bot scores with, the deltas, deviations and volatilities
+    in the order of players. Players without a stored deviation start at the model defaults.
+    """
+    return current_model().rate(
+        np.zeros(len(players), dtype=np.int64),
+        np.array([player.team for player in players], dtype=np.int64),
+        np.array([result], dtype=np.int64),
+        np.array([player.mmr for player in players], dtype=np.int64),
+        np.array([player.get('rating_deviation') or DEFAULT_DEVIATION for player in players]),
+        np.array([player.get('rating_volatility') or DEFAULT_VOLATILITY for player in players]))
+
+
+def _apply_result(cursor: Cursor, game_id: int, players: List[Player], result: int) -> List[Row]:
+    deltas, deviations, volatilities = rate_game(players, result)
+    changes = []
+    for player, delta in zip(players, deltas.tolist()):
+        changes.append({'id': player.id, 'discord_id': player.discord_id, 'team': player.team,
+                        'mmr_before': player.mmr, 'mmr': player.mmr + delta, 'delta': delta})
+    apply_player_mmr_delta.execute_many_in(
+        cursor, [(change['id'], change['delta']) for change in changes])
+    if current_model().uses_deviation:
+        set_player_rating_state.execute_many_in(
+            cursor, list(zip([player.id for player in players], deviations.tolist(), volatilities.tolist())))
+    add_rating_change.execute_many_in(
+        cursor, [(game_id, change['id'], change['mmr_before'], change['delta']) for change in changes])
+    record_player_result.execute_many_in(
+        cursor, [(change['id'], int(change['team'] == result), game_id) for change in changes])
+    refresh_player_streak.execute_many_in(cursor, [(change['id'], game_id) for change in changes])
+    return changes
+
+
+@Operation
+def score_game_result(cursor: Cursor, game_id: int, result: int, steam_match_id: int) -> List[Row]:
+    """
+    Marks the game OVER with the winning team (0 radiant, 1 dire) and applies the mmr changes.
+    Returns one row per player with mmr_before, mmr and delta.
+    Raises ValueError for an unknown game and GameAlreadyScored when it is already OVER.
+    """
+    game = get_game.execute_in(cursor, game_id).fetchone()
+    if not game:
+        raise ValueError(f'Game with id {game_id} does not exist')
+    if game.status == 'OVER':
+        raise GameAlreadyScored(f'Game {game_id} already scored')
+    score_game.execute_in(cursor, game_id, result, steam_match_id)
+    players = get_all_players_from_game.execute_in(cursor, game_id).fetchall()
+    changes = _apply_result(cursor, game_id, players, result)
+    after_commit(partial(leaderboard.update, changes))
+    return changes
+
+
+@Operation
+def recalculate_mmr(cursor: Cursor) -> None:
+    """
+    Resets every player and replays all scored games in order, rebuilding the rating change log.
+    The history is replayed in memory and written back with one executemany per table.
+    """
+    history = load_history(cursor)
+    ratings, deviations, volatilities, mmr_before, deltas = replay(history)
+    reset_all_player_mmr.execute_in(cursor)
+    set_player_mmr.execute_many_in(
+        cursor, list(zip(history.player_ids.tolist(), ratings.tolist())))
+    if current_model().uses_deviation:
+        set_player_rating_state.execute_many_in(
+            cursor, list(zip(history.player_ids.tolist(), deviations.tolist(), volatilities.tolist())))
+    cursor.execute('DELETE FROM RatingChanges')
+    add_rating_change.execute_many_in(cursor, list(zip(
+        history.entry_game_ids.tolist(), history.entry_player_ids.tolist(), mmr_before.tolist(), deltas.tolist())))
+    after_commit(leaderboard.invalidate)
+
+# maintenance functions
+
+
+@Operation
+def reset_league(cursor: Cursor) -> None:
+    """
+    Deletes every game, hot and archived, game ids restart at 1 and would collide with the archive.
+    """
+    cursor.execute('DELETE FROM Game')
+    cursor.execute('DELETE FROM GamePlayers')
+    cursor.execute('DELETE FROM GameArgs')
+    cursor.execute('DELETE FROM ArchivedGame')
+    cursor.execute('DELETE FROM ArchivedGamePlayers')
+    cursor.execute('DELETE FROM ArchivedGameArgs')
+    cursor.execute('DELETE FROM RatingChanges')
+    cursor.execute('DELETE FROM PlayerStats')
+    reset_all_player_mmr.execute_in(cursor)
+    after_commit(leaderboard.invalidate)
+
+
+@Operation
+def rebuild_player_stats(cursor: Cursor) -> None:
+    """
+    Regenerates PlayerStats from the scored games, for databases edited by hand.
+    """
+    cursor.execute('DELETE FROM PlayerStats')
+    fill_player_stats(cursor)
+    after_commit(leaderboard.invalidate)
@@ -1,14 +1,16 @@
-import itertools
 import random
 import string
 from typing import List
 
-ID = 0
-MMR = 1
+from balancer import (
+    ROLE_BALANCE_MAX_SIZE, SPLIT_TABLE_MAX_SIZE, balanced_splits, best_splits, role_mask, role_splits,
+    sample_balanced)
+
 RADINANT = 0
 DIRE = 1
 
-SUFFICIENT_NUMBER_OF_RESULTS_FOUND = 3
+BALANCE_TOLERANCE = 25  # mmr difference between the team totals
+MISSING_POSITION_COST = 100  # mmr difference a position no one on the team prefers is worth
 
 def get_random_password(n=8):
     return ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(n))
@@ -21,68 +23,32 @@ def dict_factory(cursor, row):
     return d
 
 
-def balanced_shuffle(players) -> None:
-    min_diff = float('inf')
-    team_size = len(players) // 2
-    result = ()
-    result_list = []
-
-    player_ids = [(player['id'], player['mmr']) for player in players]
-    # Generate all possible combinations of dividing the players
-    for comb in itertools.combinations(player_ids, team_size):
-        set1 = set(comb)
-        set2 = set(player_ids) - set1
-
-        sum1 = sum(player[MMR] for player in set1)
-        sum2 = sum(player[MMR] for player in set2)
-        diff = abs(sum1 - sum2)
-
-        # Update minimum difference and result if necessary
-        if diff < min_diff:
-            min_diff = diff
-            result = set1, set2
-
-        if diff < 25:
-            result_list.append((set1, set2))
-            if len(result_list) == SUFFICIENT_NUMBER_OF_RESULTS_FOUND:
-                break # We have enough results, no need to continue
+def balanced_shuffle(players, roles: bool = False) -> None:
+    # uniform among every split within tolerance, the best split when none is
+    # with roles the players' roles must be loaded and the teams also cover positions 1 to 5,
+    # lobbies above ROLE_BALANCE_MAX_SIZE balance on mmr only so the event loop is never held up
+    mmrs = [player.mmr for player in players]
+    if roles and len(players) <= ROLE_BALANCE_MAX_SIZE:
+        role_masks = [role_mask(player.roles) for player in players]
+        balanced, (_, mask) = role_splits(mmrs, role_masks, BALANCE_TOLERANCE, MISSING_POSITION_COST)
+    elif len(players) <= SPLIT_TABLE_MAX_SIZE:
+        balanced, (_, mask) = balanced_splits(mmrs, BALANCE_TOLERANCE)
+    else:
+        # drawn without listing the balanced splits, there can be millions
+        sampled = sample_balanced(mmrs, BALANCE_TOLERANCE)
+        balanced, mask = [], best_splits(mmrs)[0][1] if sampled is None else sampled
+    if balanced:
+        mask = random.choice(balanced)
 
     team = random.randint(RADINANT, DIRE)
-    shuffle_mod = len(result_list) < SUFFICIENT_NUMBER_OF_RESULTS_FOUND
-    result = result if shuffle_mod else random.choice(result_list)
-    player_ids_radiant = [p[ID] for p in result[RADINANT]]
-    #player_ids_dire = [p[ID] for p in result[DIRE]]
-
-    for player in players:
-        if player['id'] in player_ids_radiant:
-            player['team'] = team
+    for index, player in enumerate(players):
+        if mask >> index & 1:
+            player.team = team
         else:
-            player['team'] = 1 - team
+            player.team = 1 - team
 
 def split_digits(num : int) -> List[int]:
     digits = []
     for digit_char in str(num):
         digits.append(int(digit_char))
     return digits
-
-def calculate_elo(radiant_elo: float, dire_elo: float, result) -> str:
-    """
-    Calculates the new ELO rating for two teams based on the result of a match.
-    radiant_elo: The current ELO rating of team 1.
-    dire_elo: The current ELO rating of team 2.
-    result: The result of the match, either 1 for player 1 winning or -1 for player 2 winning.
-    Returns a change in absolute change in mmr.
-    """
-    k = 50  # The K-factor determines how much the ELO ratings change after a match.
-    expected_score_radiant = 1 / (1 + 10 ** ((dire_elo - radiant_elo) / 400))
-    # Convert result to a score between 0 and 1.
-    actual_score_radiant = (result + 1) / 2
-    if radiant_elo == dire_elo:
-        # Both teams have equal ELO ratings and the result is not a draw.
-        # The winning team receives 25 points.
-        if result == 1:
-            actual_score_radiant = 1
-        else:
-            actual_score_radiant = 0
-    elo_change = k * (actual_score_radiant - expected_score_radiant)
-    return str(round(abs(elo_change)))